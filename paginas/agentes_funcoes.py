@@ -1,38 +1,77 @@
 import streamlit as st
+import io
 import json
+import threading
 import firebase_admin
 import PyPDF2
-from openai import OpenAI 
-from paginas.funcoes import COLECAO_USUARIOS
+from datetime import datetime, timezone
+from google.api_core import exceptions as erros_google
+from paginas.funcoes import COLECAO_USUARIOS, obter_db, obter_arquivos_locais
+from paginas.llms import obter_cliente_openai
+from paginas.cache import invalidar_cache
+from paginas.tarefas import agendar_tarefa, executar_com_tentativas
 from firebase_admin import firestore, credentials, storage
 
+# Status de processamento gravados no documento do exame
+STATUS_PENDENTE = "pendente"
+STATUS_PROCESSANDO = "processando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
 
-# Função para ler os exames e extrair informações mais importantes
+# Exames na fila deste processo. A fila fica só na memória: um exame pendente que não
+# está aqui ficou para trás num reinício do processo e pode ser reagendado
+_exames_agendados = set()
+_trava = threading.Lock()
 
-def relator(pet_id, exame_doc_id, pdf):
-    
+# Tempo (em segundos) sem nenhuma atualização depois do qual um exame pendente é
+# considerado abandonado. O processamento normal grava o status bem antes disso
+TEMPO_LIMITE_PROCESSAMENTO = 600
+
+# Erros do Firestore que costumam passar sozinhos e valem uma nova tentativa
+ERROS_TRANSITORIOS_FIRESTORE = (
+    erros_google.ServiceUnavailable,
+    erros_google.DeadlineExceeded,
+    erros_google.Aborted,
+    erros_google.InternalServerError,
+    erros_google.TooManyRequests,
+)
+
+
+def _extrair_texto_pdf(pdf):
     """
-    Estrutura as informações obrigatórias e opcionais do exame:
-    data, tipo, resultado e mini-relatório (opcional)
+    Extrai o texto de todas as páginas de um PDF.
 
     Args:
-        - pet_id: id do respectivo pet
-        - exame_doc_id: id do documento do respectivo exame
-        - pdf: arquivo pdf presente na memória do streamlit
+        - pdf: arquivo pdf (qualquer objeto de arquivo binário)
     """
+    texto = ""
+    leitor = PyPDF2.PdfReader(pdf)
+    for pagina in leitor.pages:
+        texto_pagina = pagina.extract_text()
+        if texto_pagina:
+            texto += texto_pagina
+    return texto
 
+def _referencia_exame(email, pet_id, exame_doc_id):
+    db = obter_db()
+    return db.collection(COLECAO_USUARIOS).document(email).collection("pets").document(pet_id).collection("exames").document(exame_doc_id)
 
-    # Extraindo o texto dos pdfs
-    texto = ""
-    try:
-        leitor = PyPDF2.PdfReader(pdf)
-        for pagina in leitor.pages:
-            texto_pagina = pagina.extract_text()
-            if texto_pagina:
-                texto += texto_pagina
-    except Exception as erro:
-        print(f"Erro ao extrair o texto do pdf: {erro}")
-        return None
+def _gravar_dados_exame(email, pet_id, exame_doc_id, dados):
+    """Grava (com merge) dados no documento do exame e invalida o cache de exames do usuário."""
+    _referencia_exame(email, pet_id, exame_doc_id).set({**dados, "data_atualizacao": datetime.now()}, merge=True)
+    invalidar_cache(email, "obter_exames_pet", pet_id)
+    invalidar_cache(email, "obter_exames_pets")
+
+def _estruturar_exame(texto):
+    """
+    Usa o modelo para extrair data, tipo, resultado e mini-relatório do texto do exame.
+
+    Args:
+        - texto: texto extraído do pdf do exame
+
+    Returns:
+        dict: campos estruturados do exame
+    """
 
     # Definindo o prompt para o agente
     prompt = """Você é um agente de IA treinado para ler, extrair e interpretar informações de laudos de exames veterinários.
@@ -42,9 +81,10 @@ def relator(pet_id, exame_doc_id, pdf):
     Se qualquer um dos campos obrigatórios não puderem ser encontrados, seus respectivos valores no JSON devem ser a string 'Não encontrado'.
     """
 
-    # Criando o modelo
-    openai_api_key = st.secrets['OPENAI_API_KEY']
-    client = OpenAI(api_key=openai_api_key)
+    # Cliente compartilhado pelo processo
+    client = obter_cliente_openai()
+    if client is None:
+        raise RuntimeError("Cliente OpenAI indisponível")
 
     # Definindo o esquema para o output estruturado
 
@@ -88,15 +128,142 @@ def relator(pet_id, exame_doc_id, pdf):
         )
 
     # Saída em formato de texto, objetivando JSON
-    saida = json.loads(resposta.choices[0].message.content)
+    return json.loads(resposta.choices[0].message.content)
 
-    db = firestore.client()
-    exames_doc = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id).collection("exames").document(exame_doc_id)
+# Processamento de exames em segundo plano
 
+def processar_exame(email, pet_id, exame_doc_id, pdf_bytes=None, url_pdf=None):
+    """
+    Lê e estrutura o exame fora da thread do script, registrando o andamento no documento do exame
+    (pendente -> processando -> concluido/erro). A chamada ao modelo conta só com as novas
+    tentativas do cliente OpenAI (429/5xx/conexão); a gravação final é repetida apenas em
+    erros transitórios do Firestore.
+
+    Args:
+        - email: email do dono do pet
+        - pet_id: id do respectivo pet
+        - exame_doc_id: id do documento do respectivo exame
+        - pdf_bytes: conteúdo do pdf do exame
+        - url_pdf: url do pdf no Storage, baixado quando pdf_bytes não é informado (exame reagendado)
+    """
     try:
-        exames_doc.set(saida, merge=True)
-        return True
+        _gravar_dados_exame(email, pet_id, exame_doc_id, {"status_processamento": STATUS_PROCESSANDO})
+
+        if pdf_bytes is None:
+            caminho = obter_arquivos_locais([url_pdf])[0]
+            if caminho is None:
+                raise RuntimeError(f"Não foi possível baixar o pdf do exame: {url_pdf}")
+            with open(caminho, "rb") as arquivo:
+                pdf_bytes = arquivo.read()
+
+        # Extração é determinística: se falhar, não adianta tentar de novo
+        texto = _extrair_texto_pdf(io.BytesIO(pdf_bytes))
+
+        saida = _estruturar_exame(texto)
+        saida["status_processamento"] = STATUS_CONCLUIDO
+        saida["data_processamento"] = datetime.now()
+        executar_com_tentativas(
+            _gravar_dados_exame, email, pet_id, exame_doc_id, saida,
+            repetir_se=lambda erro: isinstance(erro, ERROS_TRANSITORIOS_FIRESTORE)
+        )
     except Exception as e:
-        print(f"Erro ao extrair informações do exame: {e}")
-        return None
+        print(f"Erro ao processar exame {exame_doc_id} do pet {pet_id}: {e}")
+        try:
+            _gravar_dados_exame(email, pet_id, exame_doc_id, {
+                "status_processamento": STATUS_ERRO,
+                "erro_processamento": str(e)[:500]
+            })
+        except Exception as erro_status:
+            print(f"Erro ao registrar falha do exame {exame_doc_id}: {erro_status}")
+
+def agendar_processamento_exame(pet_id, exame_doc_id, pdf):
+    """
+    Coloca o processamento do exame na fila de segundo plano e retorna imediatamente.
+
+    Args:
+        - pet_id: id do respectivo pet
+        - exame_doc_id: id do documento do respectivo exame
+        - pdf: arquivo pdf presente na memória do streamlit
+    """
+    # O arquivo enviado e st.user só valem durante a execução do script
+    pdf.seek(0)
+    _agendar_exame(st.user.email, pet_id, exame_doc_id, pdf_bytes=pdf.read())
+
+def retomar_exames_pendentes(exames_por_pet):
+    """
+    Reagenda os exames que ficaram 'pendente' ou 'processando' sem estar na fila deste processo
+    (o processo foi reiniciado antes de terminar). O pdf é baixado de novo do Storage.
+
+    O mapa recebido (que pode vir do cache) só seleciona os candidatos: cada um é relido
+    do Firestore e reivindicado numa transação, que só vale se o exame continua pendente
+    e sem atualização há TEMPO_LIMITE_PROCESSAMENTO segundos.
+
+    Args:
+        - exames_por_pet: mapa {pet_id: [exames]} (como retornado por obter_exames_pets)
+
+    Returns:
+        int: número de exames reagendados
+    """
+    if not hasattr(st.user, 'email'):
+        return 0
+
+    reagendados = 0
+    for pet_id, exames in exames_por_pet.items():
+        for exame in exames:
+            if exame["status_processamento"] not in (STATUS_PENDENTE, STATUS_PROCESSANDO) or not exame["url_pdf"]:
+                continue
+            with _trava:
+                if exame["id"] in _exames_agendados:
+                    continue
+            try:
+                reivindicado = _reivindicar_exame(obter_db().transaction(), _referencia_exame(st.user.email, pet_id, exame["id"]))
+            except Exception as e:
+                print(f"Erro ao reivindicar exame pendente {exame['id']}: {e}")
+                continue
+            if reivindicado and _agendar_exame(st.user.email, pet_id, exame["id"], url_pdf=exame["url_pdf"]):
+                reagendados += 1
+
+    if reagendados:
+        print(f"{reagendados} exame(s) pendente(s) reagendado(s) para {st.user.email}")
+    return reagendados
+
+def _segundos_desde(data):
+    """Segundos desde uma data do Firestore (as datas são gravadas com datetime.now())."""
+    if data is None:
+        return float("inf")
+    agora = datetime.now()
+    if data.tzinfo is not None:
+        # O Firestore devolve as datas ingênuas gravadas pelo app como UTC
+        agora = agora.replace(tzinfo=timezone.utc)
+    return (agora - data).total_seconds()
+
+@firestore.transactional
+def _reivindicar_exame(transacao, exame_ref):
+    """
+    Relê o exame (sem cache) e o marca como reagendado se ainda estiver abandonado.
+
+    Returns:
+        bool: True se o exame deve ser reagendado por quem chamou
+    """
+    dados = exame_ref.get(transaction=transacao).to_dict() or {}
+    if dados.get("status_processamento") not in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+        return False
+    if _segundos_desde(dados.get("data_atualizacao")) < TEMPO_LIMITE_PROCESSAMENTO:
+        return False
+    transacao.update(exame_ref, {"status_processamento": STATUS_PENDENTE, "data_atualizacao": datetime.now()})
+    return True
+
+def _agendar_exame(email, pet_id, exame_doc_id, pdf_bytes=None, url_pdf=None):
+    """Coloca o exame na fila, se ainda não estiver nela. Retorna False se já estava."""
+    with _trava:
+        if exame_doc_id in _exames_agendados:
+            return False
+        _exames_agendados.add(exame_doc_id)
+
+    def liberar(_):
+        with _trava:
+            _exames_agendados.discard(exame_doc_id)
+
+    agendar_tarefa(processar_exame, email, pet_id, exame_doc_id, pdf_bytes, url_pdf).add_done_callback(liberar)
+    return True
 
@@ -0,0 +1,138 @@
+import copy
+import threading
+import time
+from functools import wraps
+import streamlit as st
+
+# Tempo padrão (em segundos) que uma leitura permanece válida no cache
+TTL_PADRAO = 300
+
+# Intervalo mínimo (em segundos) entre duas varreduras das entradas vencidas
+INTERVALO_LIMPEZA = 60
+
+# Entradas do cache por usuário: {email: {(nome, argumentos): (expira_em, valor)}}
+# O dicionário vive no processo, então é compartilhado entre reruns e entre
+# sessões abertas pelo mesmo usuário
+_entradas = {}
+_trava = threading.Lock()
+_estatisticas = {"hits": 0, "misses": 0, "invalidacoes": 0, "expiradas": 0}
+_ultima_limpeza = [0.0]
+
+
+def _congelar(valor):
+    """Converte listas/dicionários em tuplas para poderem compor a chave do cache."""
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(item) for item in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((chave, _congelar(item)) for chave, item in valor.items()))
+    return valor
+
+def _remover_expiradas(agora):
+    """Remove as entradas vencidas de todos os usuários (chamar com a trava)."""
+    if agora - _ultima_limpeza[0] < INTERVALO_LIMPEZA:
+        return
+    _ultima_limpeza[0] = agora
+
+    for email in list(_entradas):
+        entradas_usuario = _entradas[email]
+        vencidas = [chave for chave, (expira_em, _) in entradas_usuario.items() if expira_em <= agora]
+        for chave in vencidas:
+            del entradas_usuario[chave]
+        _estatisticas["expiradas"] += len(vencidas)
+        if not entradas_usuario:
+            del _entradas[email]
+
+def cache_por_usuario(nome=None, ttl=TTL_PADRAO, valor_erro=None):
+    """
+    Decorador de leitura com cache (read-through) para funções que leem dados do usuário logado.
+
+    O resultado fica guardado sob o email do usuário, o nome da função e os argumentos.
+    Resultados None (documento inexistente) não são guardados. Para indicar um erro de
+    leitura, a função informa o problema e lança a exceção: quem chamou recebe valor_erro,
+    que nunca é guardado, e a próxima chamada tenta ler de novo.
+
+    Args:
+        nome: Nome usado na chave e na invalidação (padrão: nome da função)
+        ttl: Validade das entradas em segundos
+        valor_erro: Valor retornado quando a função lança uma exceção
+    """
+    def decorador(funcao):
+        nome_cache = nome or funcao.__name__
+
+        @wraps(funcao)
+        def wrapper(*args, **kwargs):
+            if not hasattr(st.user, 'email'):
+                return funcao(*args, **kwargs)
+
+            email = st.user.email
+            chave = (nome_cache, _congelar(args), _congelar(kwargs))
+            agora = time.monotonic()
+
+            with _trava:
+                entrada = _entradas.get(email, {}).get(chave)
+                if entrada and entrada[0] > agora:
+                    _estatisticas["hits"] += 1
+                    # Cópia para que quem chamou não altere o valor guardado
+                    return copy.deepcopy(entrada[1])
+                _estatisticas["misses"] += 1
+
+            try:
+                valor = funcao(*args, **kwargs)
+            except Exception:
+                return copy.deepcopy(valor_erro)
+
+            if valor is not None:
+                with _trava:
+                    _remover_expiradas(agora)
+                    _entradas.setdefault(email, {})[chave] = (agora + ttl, copy.deepcopy(valor))
+            return valor
+
+        return wrapper
+    return decorador
+
+def invalidar_cache(email, nome=None, *args):
+    """
+    Remove entradas do cache de um usuário.
+
+    Args:
+        email: Email do usuário dono das entradas
+        nome: Nome da função cujas entradas serão removidas (None remove todas do usuário)
+        *args: Se informados, remove apenas as chamadas cujos primeiros argumentos coincidem
+    """
+    if not email:
+        return
+
+    prefixo = _congelar(args)
+    with _trava:
+        entradas_usuario = _entradas.get(email)
+        if not entradas_usuario:
+            return
+
+        if nome is None:
+            removidas = len(entradas_usuario)
+            del _entradas[email]
+        else:
+            chaves = [
+                chave for chave in entradas_usuario
+                if chave[0] == nome and chave[1][:len(prefixo)] == prefixo
+            ]
+            for chave in chaves:
+                del entradas_usuario[chave]
+            removidas = len(chaves)
+
+        _estatisticas["invalidacoes"] += removidas
+
+def obter_estatisticas_cache():
+    """
+    Retorna os contadores do cache.
+
+    Returns:
+        dict: hits, misses, invalidações, entradas vencidas removidas, taxa de acerto e número de entradas guardadas
+    """
+    with _trava:
+        total = _estatisticas["hits"] + _estatisticas["misses"]
+        return {
+            **_estatisticas,
+            "taxa_acerto": _estatisticas["hits"] / total if total else 0.0,
+            "entradas": sum(len(entradas) for entradas in _entradas.values()),
+        }
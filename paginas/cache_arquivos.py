@@ -0,0 +1,231 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import unquote, urlparse
+
+# Diretório e tamanho máximo do cache local de arquivos (configuráveis por variável de ambiente)
+DIRETORIO_CACHE = os.environ.get(
+    "DR_TOBIAS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "dr_tobias_cache")
+)
+TAMANHO_MAXIMO_CACHE = int(os.environ.get("DR_TOBIAS_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Arquivos usados há menos que isso (em segundos) não são removidos: cobre o intervalo
+# entre um caminho ser devolvido e quem pediu abri-lo
+PROTECAO_USO_RECENTE = 120
+
+_trava = threading.Lock()
+_estatisticas = {"hits": 0, "misses": 0, "removidos": 0}
+
+# Índice em memória do cache: {caminho: (tamanho, último uso)}, do uso menos recente
+# para o mais recente. É montado uma vez a partir do disco e mantido a cada acesso
+_indice = OrderedDict()
+_indice_carregado = False
+_tamanho_total = 0
+# Arquivos reservados por arquivos_em_uso: {caminho: número de reservas}
+_em_uso = {}
+
+
+def _caminho_blob(url):
+    """Extrai o caminho do blob de uma URL pública do Storage (ou usa a própria URL)."""
+    caminho = unquote(urlparse(url).path).lstrip("/")
+    return caminho or url
+
+def _caminho_local(chave):
+    digest = hashlib.sha256(chave.encode("utf-8")).hexdigest()
+    return os.path.join(DIRETORIO_CACHE, digest[:2], f"{digest}.bin")
+
+def obter_arquivo(url, baixar, versao=None):
+    """
+    Retorna o caminho local de um arquivo do Storage, baixando-o só se ainda não estiver no cache.
+
+    A chave é o caminho do blob mais a versão (generation/etag). Os arquivos enviados
+    pelo app têm nome único (uuid), então o mesmo caminho nunca muda de conteúdo;
+    quem sobrescrever blobs deve informar a versão.
+
+    Args:
+        url: URL pública do arquivo
+        baixar: Função que recebe a URL e retorna o conteúdo em bytes (chamada em caso de miss)
+        versao: Generation/etag do blob (opcional)
+
+    Returns:
+        str: Caminho do arquivo no disco
+    """
+    chave = f"{_caminho_blob(url)}#{versao or ''}"
+    caminho = _caminho_local(chave)
+
+    if os.path.exists(caminho):
+        try:
+            _registrar_uso(caminho)
+            with _trava:
+                _estatisticas["hits"] += 1
+            return caminho
+        except FileNotFoundError:
+            pass  # Removido por outra thread entre as duas verificações
+
+    with _trava:
+        _estatisticas["misses"] += 1
+    _gravar_atomico(caminho, lambda arquivo: arquivo.write(baixar(url)))
+    return caminho
+
+def buscar_arquivo_gerado(chave):
+    """
+    Procura no cache um arquivo gerado pelo app (ex: relatório) a partir da sua chave.
+
+    Args:
+        chave: Identificador do arquivo gerado
+
+    Returns:
+        str: Caminho do arquivo no disco ou None se não estiver no cache
+    """
+    caminho = _caminho_local(f"gerado:{chave}")
+    try:
+        _registrar_uso(caminho)
+    except FileNotFoundError:
+        return None
+    with _trava:
+        _estatisticas["hits"] += 1
+    return caminho
+
+def gravar_arquivo_gerado(chave, escrever):
+    """
+    Grava no cache um arquivo gerado pelo app, escrevendo direto no disco.
+
+    Args:
+        chave: Identificador do arquivo gerado
+        escrever: Função que recebe o arquivo binário aberto e escreve o conteúdo nele
+
+    Returns:
+        str: Caminho do arquivo no disco
+    """
+    caminho = _caminho_local(f"gerado:{chave}")
+    _gravar_atomico(caminho, escrever)
+    return caminho
+
+def ler_arquivo(caminho):
+    """
+    Abre um arquivo do cache com leitura mapeada em memória.
+
+    Returns:
+        Objeto de arquivo binário somente leitura (mmap); feche-o após o uso
+    """
+    with open(caminho, "rb") as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            return io.BytesIO(b"")  # mmap não aceita arquivos vazios
+        return mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+@contextmanager
+def arquivos_em_uso(caminhos):
+    """
+    Impede que os arquivos sejam removidos do cache enquanto o bloco estiver em execução.
+
+    Args:
+        caminhos: Caminhos devolvidos pelo cache (entradas None são ignoradas)
+    """
+    caminhos = [caminho for caminho in caminhos if caminho]
+    with _trava:
+        for caminho in caminhos:
+            _em_uso[caminho] = _em_uso.get(caminho, 0) + 1
+    try:
+        yield
+    finally:
+        with _trava:
+            for caminho in caminhos:
+                _em_uso[caminho] -= 1
+                if not _em_uso[caminho]:
+                    del _em_uso[caminho]
+
+def obter_estatisticas_cache_arquivos():
+    """
+    Returns:
+        dict: hits, misses, arquivos removidos por falta de espaço e bytes ocupados
+    """
+    with _trava:
+        return {**_estatisticas, "bytes": _tamanho_total}
+
+def _gravar_atomico(caminho, escrever):
+    """Grava em arquivo temporário e renomeia, para nunca expor um arquivo pela metade."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escrever(arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    # O temporário não entra no índice: só o arquivo completo, como usado agora
+    _registrar_uso(caminho)
+
+def _carregar_indice():
+    """Monta o índice a partir do disco, uma vez por processo (chamar com a trava)."""
+    global _indice_carregado, _tamanho_total
+    if _indice_carregado:
+        return
+    arquivos = []
+    for raiz, _, nomes in os.walk(DIRETORIO_CACHE):
+        for nome in nomes:
+            if not nome.endswith(".bin"):
+                continue
+            caminho = os.path.join(raiz, nome)
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, caminho))
+    # Arquivos de execuções anteriores entram como não usados, na ordem da data de modificação
+    for _, tamanho, caminho in sorted(arquivos):
+        if caminho not in _indice:
+            _indice[caminho] = (tamanho, 0.0)
+            _tamanho_total += tamanho
+    _indice_carregado = True
+
+def _registrar_uso(caminho):
+    """
+    Marca o arquivo como usado agora (no índice e na data de modificação, que guarda a
+    ordem LRU entre reinícios) e remove o excedente. Levanta FileNotFoundError se ele sumiu.
+    """
+    global _tamanho_total
+    os.utime(caminho)
+    tamanho = os.stat(caminho).st_size
+    with _trava:
+        _carregar_indice()
+        anterior = _indice.pop(caminho, None)
+        if anterior:
+            _tamanho_total -= anterior[0]
+        _indice[caminho] = (tamanho, time.monotonic())
+        _tamanho_total += tamanho
+        _remover_excedente()
+
+def _remover_excedente():
+    """
+    Remove os arquivos usados há mais tempo até o cache caber no tamanho máximo (chamar com a trava).
+
+    Arquivos reservados por arquivos_em_uso ou usados há menos de PROTECAO_USO_RECENTE
+    segundos ficam, mesmo que o cache passe do limite por um tempo.
+    """
+    global _tamanho_total
+    if _tamanho_total <= TAMANHO_MAXIMO_CACHE:
+        return
+    limite_recente = time.monotonic() - PROTECAO_USO_RECENTE
+    for caminho, (tamanho, ultimo_uso) in list(_indice.items()):
+        if _tamanho_total <= TAMANHO_MAXIMO_CACHE or ultimo_uso > limite_recente:
+            break  # Daqui em diante, todos foram usados recentemente
+        if caminho in _em_uso:
+            continue
+        try:
+            os.remove(caminho)
+            _estatisticas["removidos"] += 1
+        except FileNotFoundError:
+            pass  # Já removido (por outro processo, por exemplo)
+        except OSError as e:
+            print(f"Erro ao remover {caminho} do cache de arquivos: {e}")
+            continue
+        del _indice[caminho]
+        _tamanho_total -= tamanho
@@ -0,0 +1,216 @@
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from paginas.llms import obter_cliente_openai
+
+# Cache semântico de respostas para perguntas genéricas (que não dependem dos pets do usuário).
+# As perguntas são normalizadas e convertidas em embeddings; uma pergunta nova reaproveita a
+# resposta de outra cuja similaridade de cosseno passe do limiar
+MODELO_EMBEDDING = "text-embedding-3-small"
+DIMENSOES_EMBEDDING = 256  # Vetores reduzidos: a busca linear em Python continua rápida
+LIMIAR_SIMILARIDADE = float(os.environ.get("DR_TOBIAS_CACHE_LIMIAR", "0.92"))
+TTL_RESPOSTAS = int(os.environ.get("DR_TOBIAS_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_RESPOSTAS = int(os.environ.get("DR_TOBIAS_CACHE_MAX_RESPOSTAS", "500"))
+
+# Palavras que indicam que a pergunta fala dos pets ou da situação do próprio usuário.
+# Na dúvida a pergunta é tratada como pessoal: só as claramente genéricas vão para o cache.
+# Comparadas com a pergunta normalizada (sem acentos: "faço" vira "faco", "tô" vira "to")
+PALAVRAS_PESSOAIS = re.compile(
+    r"\b("
+    # Possessivos e pronomes da primeira pessoa
+    r"meu|minha|meus|minhas|nosso|nossa|nossos|nossas|eu|me|mim|comigo|conosco|a gente"
+    # Pronomes da terceira pessoa (quase sempre o pet de quem pergunta)
+    r"|ele|ela|eles|elas|dele|dela|deles|delas|nele|nela|neles|nelas|lhe|lhes"
+    # Verbos na primeira pessoa que contam a situação de quem pergunta
+    r"|tenho|tinha|temos|estou|to|estava|estamos|fiz|faco|fazemos|vi|dei|dou|levo|moro|moramos"
+    # Pretérito na primeira pessoa ("levei", "notei", "reparei", "percebi")
+    r"|\w{2,}ei|percebi"
+    # Referências a um momento específico
+    r"|ontem|anteontem|hoje"
+    r")\b"
+)
+
+# Índice do processo: {pergunta normalizada: entrada}, do uso menos recente para o mais recente
+_indice = OrderedDict()
+_trava = threading.Lock()
+_estatisticas = {"consultas": 0, "hits": 0, "misses": 0, "ignoradas": 0, "removidas": 0, "segundos_economizados": 0.0}
+
+
+def normalizar_pergunta(texto):
+    """Minúsculas, sem acentos, sem pontuação e com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(caractere for caractere in texto if not unicodedata.combining(caractere))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+def pode_usar_cache(pergunta, mensagens, termos_privados=()):
+    """
+    Indica se uma pergunta é genérica o bastante para usar o cache.
+
+    Ficam de fora perguntas feitas no meio de uma conversa (a resposta depende do que
+    já foi dito), que citam um pet ou dado do usuário ou que usam possessivos, pronomes
+    ("ele", "ela") ou verbos na primeira pessoa ("tenho", "levei"). Essas são respondidas
+    com o prompt personalizado e não entram no cache.
+
+    Args:
+        pergunta: Texto da pergunta
+        mensagens: Histórico da conversa (a última é a pergunta)
+        termos_privados: Nomes dos pets e do usuário
+
+    Returns:
+        bool: True se a resposta pode vir do cache (e ser guardada nele)
+    """
+    normalizada = normalizar_pergunta(pergunta)
+    perguntas_anteriores = [msg for msg in mensagens[:-1] if msg["role"] == "user"]
+    termos = {normalizar_pergunta(termo) for termo in termos_privados if termo}
+
+    usar = (
+        bool(normalizada)
+        and not perguntas_anteriores
+        and not PALAVRAS_PESSOAIS.search(normalizada)
+        and not any(re.search(rf"\b{re.escape(termo)}\b", normalizada) for termo in termos if termo)
+    )
+    if not usar:
+        with _trava:
+            _estatisticas["ignoradas"] += 1
+    return usar
+
+def _gerar_embedding(texto):
+    """Gera o embedding normalizado (norma 1) de um texto, ou None se falhou."""
+    client = obter_cliente_openai()
+    if not client:
+        return None
+    try:
+        resposta = client.embeddings.create(
+            model=MODELO_EMBEDDING,
+            input=texto,
+            dimensions=DIMENSOES_EMBEDDING
+        )
+        vetor = resposta.data[0].embedding
+    except Exception as e:
+        print(f"Erro ao gerar embedding da pergunta: {e}")
+        return None
+    norma = math.sqrt(sum(valor * valor for valor in vetor)) or 1.0
+    return [valor / norma for valor in vetor]
+
+def _similaridade(vetor_a, vetor_b):
+    # Vetores já normalizados: o produto escalar é o cosseno
+    return sum(a * b for a, b in zip(vetor_a, vetor_b))
+
+def buscar_resposta(pergunta):
+    """
+    Procura no cache uma resposta para a pergunta (igual depois de normalizada ou semelhante).
+
+    Args:
+        pergunta: Texto da pergunta (já aprovada por pode_usar_cache)
+
+    Returns:
+        dict: 'resposta' (str ou None se não achou), 'similaridade' e 'consulta', que deve
+              ser passada a guardar_resposta quando a resposta for gerada; None se o embedding falhou
+    """
+    inicio = time.monotonic()
+    normalizada = normalizar_pergunta(pergunta)
+    consulta = {"pergunta": normalizada, "vetor": None}
+
+    with _trava:
+        _estatisticas["consultas"] += 1
+        _remover_expiradas()
+        entrada = _indice.get(normalizada)
+        if entrada:
+            return _registrar_hit(normalizada, entrada, 1.0, consulta, inicio)
+
+    # Chamada de rede fora da trava
+    vetor = _gerar_embedding(normalizada)
+    if vetor is None:
+        with _trava:
+            _estatisticas["misses"] += 1
+        return None
+    consulta["vetor"] = vetor
+
+    with _trava:
+        melhor_chave, melhor_similaridade = None, LIMIAR_SIMILARIDADE
+        for chave, entrada in _indice.items():
+            similaridade = _similaridade(vetor, entrada["vetor"])
+            if similaridade >= melhor_similaridade:
+                melhor_chave, melhor_similaridade = chave, similaridade
+        if melhor_chave is not None:
+            return _registrar_hit(melhor_chave, _indice[melhor_chave], melhor_similaridade, consulta, inicio)
+
+        _estatisticas["misses"] += 1
+    return {"resposta": None, "similaridade": 0.0, "consulta": consulta}
+
+def _registrar_hit(chave, entrada, similaridade, consulta, inicio):
+    """Marca a entrada como usada agora e soma o tempo economizado (chamar com a trava)."""
+    _indice.move_to_end(chave)
+    _estatisticas["hits"] += 1
+    _estatisticas["segundos_economizados"] += max(entrada["latencia"] - (time.monotonic() - inicio), 0.0)
+    return {"resposta": entrada["resposta"], "similaridade": similaridade, "consulta": consulta}
+
+def guardar_resposta(consulta, resposta, latencia, termos_privados=()):
+    """
+    Guarda a resposta gerada para uma pergunta genérica.
+
+    O cache é compartilhado por todos os usuários: a resposta precisa ter sido gerada só
+    com PROMPT_ESTATICO e a pergunta, sem perfil, pets ou histórico. Como proteção extra,
+    respostas que citam o usuário ou seus pets não são guardadas.
+    Pode ser chamada fora da thread do script.
+
+    Args:
+        consulta: Valor 'consulta' retornado por buscar_resposta
+        resposta: Texto completo da resposta
+        latencia: Tempo (em segundos) que a resposta levou para ser gerada
+        termos_privados: Nomes dos pets e do usuário
+
+    Returns:
+        bool: True se a resposta foi guardada
+    """
+    if not consulta or consulta.get("vetor") is None or not resposta:
+        return False
+
+    resposta_normalizada = normalizar_pergunta(resposta)
+    for termo in termos_privados:
+        termo = normalizar_pergunta(termo or "")
+        if termo and re.search(rf"\b{re.escape(termo)}\b", resposta_normalizada):
+            return False
+
+    with _trava:
+        _indice[consulta["pergunta"]] = {
+            "vetor": consulta["vetor"],
+            "resposta": resposta,
+            "latencia": latencia,
+            "expira_em": time.monotonic() + TTL_RESPOSTAS,
+        }
+        _indice.move_to_end(consulta["pergunta"])
+        # Remove as usadas há mais tempo quando passa do limite
+        while len(_indice) > MAX_RESPOSTAS:
+            _indice.popitem(last=False)
+            _estatisticas["removidas"] += 1
+    return True
+
+def _remover_expiradas():
+    """Remove as entradas vencidas (chamar com a trava)."""
+    agora = time.monotonic()
+    expiradas = [chave for chave, entrada in _indice.items() if entrada["expira_em"] <= agora]
+    for chave in expiradas:
+        del _indice[chave]
+    _estatisticas["removidas"] += len(expiradas)
+
+def obter_estatisticas_cache_respostas():
+    """
+    Retorna os contadores do cache de respostas.
+
+    Returns:
+        dict: consultas, hits, misses, perguntas ignoradas (pessoais), entradas removidas,
+              taxa de acerto, segundos economizados e número de respostas guardadas
+    """
+    with _trava:
+        total = _estatisticas["hits"] + _estatisticas["misses"]
+        return {
+            **_estatisticas,
+            "taxa_acerto": _estatisticas["hits"] / total if total else 0.0,
+            "entradas": len(_indice),
+        }
@@ -1,5 +1,4 @@
 import streamlit as st
-from openai import OpenAI 
 from paginas.funcoes import (
     obter_perfil_usuario, 
     registrar_acao_usuario, 
@@ -9,9 +8,23 @@ from paginas.funcoes import (
     obter_chat, 
     excluir_chat,
     atualizar_chat,
-    login_usuario
+    obter_system_prompt,
+    obter_pets,
+    login_usuario,
+    CHATS_POR_PAGINA
 )
-from paginas.llms import gerar_titulo_chat
+from paginas.contexto import montar_requisicao_chat
+from paginas.prompts import PROMPT_ESTATICO
+from paginas.geracao import (
+    iniciar_geracao,
+    acompanhar_geracao,
+    finalizar_geracao,
+    abandonar_geracao,
+    retomar_geracao_do_chat,
+    agendar_tarefas_pos_resposta
+)
+from paginas.cache_respostas import pode_usar_cache, buscar_resposta, obter_estatisticas_cache_respostas
+from paginas.exibicao import criar_renderizador, formatar_resposta, MENSAGENS_POR_PAGINA
 from datetime import datetime
 
 # Verifica se o usuário está logado
@@ -48,10 +61,6 @@ if st.session_state.get('show_welcome_message', False):
     # Remove o flag para não mostrar novamente
     del st.session_state['show_welcome_message']
 
-# Configurações iniciais
-openai_api_key = st.secrets["OPENAI_API_KEY"]
-client = OpenAI(api_key=openai_api_key)
-
 # Função para obter avatar do usuário
 def obter_avatar_usuario():
     """Define o avatar do usuário baseado na foto do perfil"""
@@ -79,67 +88,186 @@ avatar_assistant = 'arquivos/avatar_assistente.jpg'
 
 MENSAGEM_INICIAL = obter_mensagem_inicial()
 
-def obter_system_prompt(perfil):
-    """Gera o system prompt personalizado para Dr. Tobias"""
-    return f"""
-
-**PERSONA:** Você é Dr. Tobias, um assistente veterinário virtual caloroso, experiente e dedicado. Profissional competente, bem-humorado e acolhedor. Fala em português-BR, frases curtas, **negrito** para destaques e máx. *dois emojis* por mensagem.
-
-INFORMAÇÕES DO USUÁRIO:
-- Nome: {perfil.get('nome_completo', 'Não informado')}
-- Idade: {perfil.get('idade', 'Não informada')}
-- Experiência com Pets: {perfil.get('experiencia_pets', 'Não informada')}
-- Tipos de Pets: {perfil.get('tipos_pets', 'Não informado')}
-- Situação Atual: {perfil.get('situacao_atual', 'Não informada')}
-
-INFORMAÇÕES DOS PETS:
-{perfil.get('resumos_pet', 'Resumo ainda não informado')}
-
-## 2. Missão
-
-Durante uma conversa **natural e acolhedora**, ajude o usuário com questões sobre pets, descobrindo discretamente informações importantes para dar o melhor conselho. Seja um assistente veterinário dedicado e empático.
-
-### Cinco áreas principais de atuação
-
-1. **Saúde básica** — Sintomas, prevenção, cuidados diários.
-2. **Comportamento** — Problemas comportamentais e treinamento.
-3. **Alimentação** — Dieta adequada, quantidade, horários.
-4. **Cuidados gerais** — Higiene, exercícios, ambiente.
-5. **Primeiros socorros** — Orientações para emergências básicas.
-
-*Exemplos de abordagens (usar conforme a situação):*
-
-* "Como tem sido a rotina do seu pet ultimamente?"
-* "Você notou alguma mudança no comportamento ou apetite?"
-* "Que tipo de alimentação você tem oferecido?"
-* "Como está o ambiente onde ele fica?"
-* "Já teve alguma experiência com emergências veterinárias?"
-
----
-
-## 3. Estratégia de Atendimento
-
-1. **Engaje** com interesse genuíno sobre os pets do usuário.
-2. **Colete informações** relevantes de forma natural para dar conselhos precisos.
-3. **IMPORTANTE**: Para emergências ou sintomas graves, **sempre** oriente a buscar um veterinário presencial imediatamente.
-4. Seja sempre **prático e claro** nas orientações, mas sem esquecer o carinho.
-
----
-
-## 4. Regras "Nunca Fazer"
-
-* Nunca diagnosticar doenças ou prescrever medicamentos específicos.
-* **SEMPRE** orientar a buscar veterinário presencial para emergências.
-* Evitar dar conselhos que possam colocar o animal em risco.
-* Não alegar ser um veterinário real; deixar claro que é um assistente IA.
-* Respeitar imediatamente se o usuário disser **parar**.
-
----
-
-### 🐾 Resumo Operacional
-
-Seja um assistente veterinário virtual dedicado e empático. Ajude com **orientações gerais, comportamento, cuidados básicos e prevenção**. Sempre priorize o bem-estar animal e oriente para cuidados profissionais quando necessário. 
-"""
+def salvar_mensagens_pendentes():
+    """
+    Salva no Firestore as mensagens da sessão que ainda não foram gravadas.
+
+    Se ainda não há chat ativo, cria um com título provisório.
+
+    Returns:
+        bool: True se um chat novo foi criado
+    """
+    if st.session_state.chat_ativo_id is None:
+        # Título provisório; o definitivo é gerado em segundo plano depois da primeira resposta
+        titulo = f"Conversa de {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+        chat_id = salvar_chat(titulo, st.session_state.mensagens)
+        if chat_id:
+            st.session_state.chat_ativo_id = chat_id
+            st.session_state.chat_ativo_nome = titulo
+            st.session_state.mensagens_persistidas = len(st.session_state.mensagens)
+            registrar_acao_usuario("Nova Conversa Salva", f"Conversa salva automaticamente: {titulo}")
+            return True
+        return False
+    
+    # Anexa à conversa existente apenas as mensagens ainda não salvas
+    persistidas = st.session_state.mensagens_persistidas
+    if atualizar_chat(st.session_state.chat_ativo_id, st.session_state.mensagens[persistidas:], persistidas):
+        st.session_state.mensagens_persistidas = len(st.session_state.mensagens)
+    return False
+
+def acompanhar_resposta():
+    """
+    Exibe a resposta que está sendo gerada em segundo plano e, quando ela termina,
+    incorpora-a à conversa da sessão.
+
+    Se o script for executado de novo no meio (clique, troca de página), a execução seguinte
+    volta a exibir a resposta do ponto em que ela está. Se a sessão se perder (página
+    recarregada, reconexão), a resposta é retomada ao abrir a conversa na barra lateral.
+    """
+    geracao = st.session_state.geracao_ativa
+    
+    # A conversa exibida mudou: a resposta continua sendo gravada, só não é mais exibida aqui
+    if geracao["chat_id"] != st.session_state.chat_ativo_id:
+        abandonar_geracao(geracao["id"])
+        st.session_state.geracao_ativa = None
+        return
+    
+    with st.chat_message("assistant", avatar=avatar_assistant):
+        container = st.empty()
+        renderizar = criar_renderizador(container)
+        
+        versao = -1
+        while True:
+            estado = acompanhar_geracao(geracao["id"], versao)
+            if estado is None or estado["concluida"]:
+                break
+            if estado["versao"] != versao:
+                versao = estado["versao"]
+                renderizar(estado["texto"])
+            else:
+                # Nenhum pedaço novo no tempo de espera: o modelo pausou, mostra o que ficou guardado
+                renderizar.descarregar()
+        
+        estado = finalizar_geracao(geracao["id"])
+        st.session_state.geracao_ativa = None
+        if estado is None:
+            # Processo reiniciado: o que foi salvo aparece ao abrir a conversa de novo
+            container.empty()
+            return
+        
+        # Remove o cursor e mostra resposta final
+        renderizar(estado["texto"], final=True)
+        
+        uso_tokens = estado["uso"]
+        if uso_tokens:
+            print(
+                f"Uso de tokens: {uso_tokens['tokens_prompt_api']} de prompt, "
+                f"{uso_tokens['tokens_cache']} do cache, {uso_tokens['tokens_resposta']} de resposta"
+            )
+        
+        # Adiciona resposta ao histórico (interrompida por erro, se for o caso)
+        if estado["texto"]:
+            mensagem = {"role": "assistant", "content": estado["texto"]}
+            if estado["erro"]:
+                mensagem["parcial"] = True
+            st.session_state.mensagens.append(mensagem)
+        
+        tarefas = estado["tarefas"]
+        if estado["persistida"]:
+            st.session_state.mensagens_persistidas = len(st.session_state.mensagens)
+        else:
+            # A gravação em segundo plano não foi possível: salva daqui (cria o chat, se preciso)
+            chat_criado = salvar_mensagens_pendentes()
+            if not estado["erro"] and st.session_state.chat_ativo_id:
+                tarefas = agendar_tarefas_pos_resposta(
+                    st.user.email,
+                    st.session_state.chat_ativo_id,
+                    list(st.session_state.mensagens),
+                    gerar_titulo=chat_criado,
+                    resumo_chat=geracao["resumo_chat"]
+                )
+        
+        # Título e resumo ficam prontos depois; a sessão os aproveita numa próxima execução
+        if "titulo" in tarefas:
+            st.session_state.tarefa_titulo = tarefas["titulo"]
+        if "resumo" in tarefas:
+            st.session_state.tarefa_resumo = tarefas["resumo"]
+        
+        if estado["erro"]:
+            st.error(f"Ops! Tive um probleminha técnico: {estado['erro']}")
+            st.error("Tenta novamente, por favor! 🐾")
+            return
+        
+        if not geracao["chat_criado"]:
+            registrar_acao_usuario("Conversa Atualizada", f"Conversa {st.session_state.chat_ativo_nome} atualizada")
+        
+        # Registra a resposta
+        registrar_atividade_academica(
+            tipo="chatbot_dr_tobias",
+            modulo="Assistente Veterinário",
+            detalhes={
+                "acao": "resposta",
+                "tamanho_resposta": len(estado["texto"]),
+                "tokens_prompt": geracao["info_contexto"]["tokens_prompt"],
+                "mensagens_contexto": geracao["info_contexto"]["mensagens_incluidas"],
+                **uso_tokens,
+                "chat_id": st.session_state.chat_ativo_id,
+                "chat_nome": st.session_state.chat_ativo_nome
+            }
+        )
+
+def responder_do_cache(resposta, similaridade, chat_criado, resumo_chat):
+    """
+    Exibe na hora uma resposta vinda do cache de respostas e a incorpora à conversa,
+    sem chamar o modelo.
+
+    Args:
+        resposta: Texto da resposta guardada
+        similaridade: Similaridade entre a pergunta e a pergunta guardada
+        chat_criado: Se o chat foi criado com esta pergunta (precisa de título)
+        resumo_chat: Resumo atual {"resumo", "resumo_ate"} ou None para não resumir
+    """
+    with st.chat_message("assistant", avatar=avatar_assistant):
+        st.markdown(formatar_resposta(resposta))
+    
+    st.session_state.mensagens.append({"role": "assistant", "content": resposta})
+    salvar_mensagens_pendentes()
+    
+    if st.session_state.chat_ativo_id:
+        tarefas = agendar_tarefas_pos_resposta(
+            st.user.email,
+            st.session_state.chat_ativo_id,
+            list(st.session_state.mensagens),
+            gerar_titulo=chat_criado,
+            resumo_chat=resumo_chat
+        )
+        if "titulo" in tarefas:
+            st.session_state.tarefa_titulo = tarefas["titulo"]
+        if "resumo" in tarefas:
+            st.session_state.tarefa_resumo = tarefas["resumo"]
+    
+    if not chat_criado:
+        registrar_acao_usuario("Conversa Atualizada", f"Conversa {st.session_state.chat_ativo_nome} atualizada")
+    
+    estatisticas = obter_estatisticas_cache_respostas()
+    print(
+        f"Resposta do cache (similaridade {similaridade:.3f}): taxa de acerto {estatisticas['taxa_acerto']:.0%}, "
+        f"{estatisticas['segundos_economizados']:.1f}s economizados"
+    )
+    
+    # Registra a resposta
+    registrar_atividade_academica(
+        tipo="chatbot_dr_tobias",
+        modulo="Assistente Veterinário",
+        detalhes={
+            "acao": "resposta",
+            "tamanho_resposta": len(resposta),
+            "cache": True,
+            "similaridade": round(similaridade, 3),
+            "chat_id": st.session_state.chat_ativo_id,
+            "chat_nome": st.session_state.chat_ativo_nome
+        }
+    )
 
 # Inicialização do histórico de mensagens e chat ativo
 if 'mensagens' not in st.session_state:
@@ -156,12 +284,73 @@ if 'chat_ativo_id' not in st.session_state:
 if 'chat_ativo_nome' not in st.session_state:
     st.session_state.chat_ativo_nome = "Nova Conversa"
 
+# Conversas mais antigas que a primeira página, trazidas com "Carregar mais", e a
+# primeira página (ids e datas) no momento em que elas foram carregadas
+if 'chats_anteriores' not in st.session_state:
+    st.session_state.chats_anteriores = []
+    st.session_state.chats_esgotados = False
+    st.session_state.chats_assinatura = None
+
+# Quantas mensagens da conversa ativa já estão salvas no Firestore
+if 'mensagens_persistidas' not in st.session_state:
+    st.session_state.mensagens_persistidas = 0
+
+# Quantas mensagens da conversa ativa são exibidas (cresce com "Carregar mensagens anteriores")
+if 'mensagens_visiveis' not in st.session_state:
+    st.session_state.mensagens_visiveis = MENSAGENS_POR_PAGINA
+
+# Resposta sendo gerada em segundo plano: {"id", "chat_id", ...} ou None
+if 'geracao_ativa' not in st.session_state:
+    st.session_state.geracao_ativa = None
+
+# Perguntas enviadas durante uma resposta, respondidas uma a uma quando ela terminar
+if 'perguntas_pendentes' not in st.session_state:
+    st.session_state.perguntas_pendentes = []
+
+# Resumo das mensagens mais antigas da conversa ativa (gerado em segundo plano)
+if 'resumo_chat' not in st.session_state:
+    st.session_state.resumo_chat = {"resumo": None, "resumo_ate": 0}
+
+# Resumo em andamento, se houver (Future do pool de segundo plano)
+if 'tarefa_resumo' not in st.session_state:
+    st.session_state.tarefa_resumo = None
+
+# Aproveita o resumo que terminou de ser gerado desde a última execução
+tarefa_resumo = st.session_state.tarefa_resumo
+if tarefa_resumo is not None and tarefa_resumo.done():
+    resultado_resumo = tarefa_resumo.result()
+    if resultado_resumo and resultado_resumo["chat_id"] == st.session_state.chat_ativo_id:
+        st.session_state.resumo_chat = {
+            "resumo": resultado_resumo["resumo"],
+            "resumo_ate": resultado_resumo["resumo_ate"]
+        }
+    st.session_state.tarefa_resumo = None
+
+# Título da conversa nova sendo gerado em segundo plano, se houver
+if 'tarefa_titulo' not in st.session_state:
+    st.session_state.tarefa_titulo = None
+
+# Troca o título provisório pelo gerado, se já estiver pronto
+tarefa_titulo = st.session_state.tarefa_titulo
+if tarefa_titulo is not None and tarefa_titulo.done():
+    resultado_titulo = tarefa_titulo.result()
+    if resultado_titulo and resultado_titulo["chat_id"] == st.session_state.chat_ativo_id:
+        st.session_state.chat_ativo_nome = resultado_titulo["titulo"]
+    st.session_state.tarefa_titulo = None
+
 # Título da página
 st.title("🐾 Dr. Tobias - Especialista em Pets")
 st.markdown("*Seu assistente veterinário virtual está aqui para ajudar você e seus bichinhos! 🐾*")
 
 # Sidebar com histórico de chats
-with st.sidebar: 
+@st.fragment
+def lista_chats():
+    """
+    Lista de conversas da barra lateral.
+    
+    "Carregar mais" e a exclusão de outra conversa atualizam só a lista; abrir,
+    iniciar ou excluir a conversa ativa recarregam a página, pois mudam as mensagens exibidas.
+    """
     
     # Botão de novo chat
     if st.button("✨ Nova Conversa", key="novo_chat", use_container_width=True, type="primary"):
@@ -174,11 +363,22 @@ with st.sidebar:
         ]
         st.session_state.chat_ativo_id = None
         st.session_state.chat_ativo_nome = "Nova Conversa"
+        st.session_state.mensagens_persistidas = 0
+        st.session_state.mensagens_visiveis = MENSAGENS_POR_PAGINA
+        st.session_state.resumo_chat = {"resumo": None, "resumo_ate": 0}
+        st.session_state.perguntas_pendentes = []
         registrar_acao_usuario("Nova Conversa", "Usuário iniciou nova conversa com Dr. Tobias")
         st.rerun()
     
-    # Exibir chats existentes
-    chats = obter_chats() 
+    # Exibir chats existentes: a primeira página vem do cache; as seguintes já estão na sessão
+    primeira_pagina = obter_chats()
+    assinatura = [(chat['id'], chat['data_atualizacao']) for chat in primeira_pagina]
+    if st.session_state.chats_anteriores and assinatura != st.session_state.chats_assinatura:
+        # A primeira página mudou (chat novo, mensagem nova, exclusão): as conversas se deslocaram
+        # entre as páginas, então as seguintes são descartadas e carregadas de novo sob demanda
+        st.session_state.chats_anteriores = []
+        st.session_state.chats_esgotados = False
+    chats = primeira_pagina + st.session_state.chats_anteriores
     
     if len(chats) == 0:
         st.info("Você ainda não tem conversas salvas com Dr. Tobias! 🐾")
@@ -189,14 +389,35 @@ with st.sidebar:
             if st.button(f"{chat['nome']}", key=f"chat_{chat['id']}", use_container_width=True):
                 chat_data = obter_chat(chat['id'])
                 if chat_data and 'mensagens' in chat_data:
-                    st.session_state.mensagens = chat_data['mensagens']
+                    mensagens = chat_data['mensagens']
+                    # A resposta desta conversa pode ainda estar sendo gerada (ex: a página foi
+                    # recarregada no meio): volta a acompanhá-la em vez de exibir o último
+                    # checkpoint salvo como uma resposta interrompida
+                    geracao = retomar_geracao_do_chat(st.user.email, chat['id'])
+                    if geracao:
+                        ativa = st.session_state.geracao_ativa
+                        if ativa and ativa["id"] != geracao["id"]:
+                            abandonar_geracao(ativa["id"])
+                        mensagens = mensagens[:geracao["ordem"]]
+                        st.session_state.geracao_ativa = {**geracao["dados_sessao"], "id": geracao["id"], "chat_id": chat['id']}
+                    st.session_state.mensagens = mensagens
                     st.session_state.chat_ativo_id = chat['id']
                     st.session_state.chat_ativo_nome = chat['nome']
+                    st.session_state.mensagens_persistidas = len(mensagens)
+                    st.session_state.mensagens_visiveis = MENSAGENS_POR_PAGINA
+                    st.session_state.resumo_chat = {
+                        "resumo": chat_data.get('resumo'),
+                        "resumo_ate": chat_data.get('resumo_ate', 0)
+                    }
+                    st.session_state.perguntas_pendentes = []
                     registrar_acao_usuario("Abrir Conversa", f"Usuário abriu a conversa {chat['nome']}")
                     st.rerun()
         with col2:
             if st.button("🗑️", key=f"excluir_{chat['id']}"):
                 excluir_chat(chat['id'])
+                st.session_state.chats_anteriores = [
+                    anterior for anterior in st.session_state.chats_anteriores if anterior['id'] != chat['id']
+                ]
                 registrar_acao_usuario("Excluir Conversa", f"Usuário excluiu a conversa {chat['nome']}")
                 # Se o chat excluído for o ativo, iniciar um novo chat
                 if st.session_state.chat_ativo_id == chat['id']:
@@ -209,31 +430,78 @@ with st.sidebar:
                     ]
                     st.session_state.chat_ativo_id = None
                     st.session_state.chat_ativo_nome = "Nova Conversa"
-                st.rerun()
-
-# Exibição do histórico de mensagens
-for mensagem in st.session_state.mensagens:
-    role = mensagem["role"]
-    # Define o avatar a ser exibido baseado no role
-    if role == "user":
-        display_avatar = avatar_user
-    elif role == "assistant":
-        display_avatar = avatar_assistant
-    else:
-        display_avatar = None
-        
-    with st.chat_message(role, avatar=display_avatar):
-        # Aplica as substituições para formato de matemática do Streamlit apenas nas mensagens do assistente
-        if role == "assistant":
-            display_content = mensagem["content"].replace('\\[', '$$').replace('\\]', '$$')\
-                                               .replace('\\(', '$').replace('\\)', '$')
-            st.markdown(display_content)
+                    st.session_state.mensagens_persistidas = 0
+                    st.session_state.mensagens_visiveis = MENSAGENS_POR_PAGINA
+                    st.session_state.resumo_chat = {"resumo": None, "resumo_ate": 0}
+                    st.session_state.perguntas_pendentes = []
+                    # Mudou a conversa exibida: recarrega a página inteira
+                    st.rerun()
+                st.rerun(scope="fragment")
+    
+    # Se a primeira página veio cheia, pode haver conversas mais antigas
+    if len(primeira_pagina) >= CHATS_POR_PAGINA and not st.session_state.chats_esgotados:
+        if st.button(f"Carregar mais {CHATS_POR_PAGINA} conversas", key="carregar_mais_chats", use_container_width=True):
+            # Busca só a página seguinte à última conversa exibida e a junta às já carregadas
+            pagina = obter_chats(apos=chats[-1]['data_atualizacao'])
+            st.session_state.chats_anteriores.extend(pagina)
+            st.session_state.chats_assinatura = assinatura
+            if len(pagina) < CHATS_POR_PAGINA:
+                st.session_state.chats_esgotados = True
+            st.rerun(scope="fragment")
+
+with st.sidebar:
+    lista_chats()
+
+# Exibição do histórico de mensagens (só as mais recentes; as anteriores sob demanda)
+@st.fragment
+def historico_mensagens():
+    """Mensagens da conversa ativa; "Carregar mensagens anteriores" atualiza só esta área."""
+    mensagens_ocultas = max(0, len(st.session_state.mensagens) - st.session_state.mensagens_visiveis)
+    if mensagens_ocultas:
+        if st.button(f"⬆️ Carregar mensagens anteriores ({mensagens_ocultas})", key="carregar_mensagens_anteriores", use_container_width=True):
+            st.session_state.mensagens_visiveis += MENSAGENS_POR_PAGINA
+            # A última pergunta/resposta é desenhada fora desta área; se ela ainda não
+            # passou por aqui, recarrega a página toda para não exibi-la duas vezes
+            if len(st.session_state.mensagens) == st.session_state.get("mensagens_no_historico"):
+                st.rerun(scope="fragment")
+            st.rerun()
+
+    for mensagem in st.session_state.mensagens[mensagens_ocultas:]:
+        role = mensagem["role"]
+        # Define o avatar a ser exibido baseado no role
+        if role == "user":
+            display_avatar = avatar_user
+        elif role == "assistant":
+            display_avatar = avatar_assistant
         else:
-            st.write(mensagem["content"])
+            display_avatar = None
+        
+        with st.chat_message(role, avatar=display_avatar):
+            # Aplica as substituições para formato de matemática do Streamlit apenas nas mensagens do assistente
+            if role == "assistant":
+                st.markdown(formatar_resposta(mensagem["content"]))
+                if mensagem.get("parcial"):
+                    st.caption("⚠️ Esta resposta foi interrompida antes de terminar.")
+            else:
+                st.write(mensagem["content"])
+    
+    st.session_state.mensagens_no_historico = len(st.session_state.mensagens)
+
+historico_mensagens()
 
 # Input e processamento de mensagens
 prompt = st.chat_input(placeholder="Me conta sobre seus pets... 🐾")
 
+# Uma pergunta enviada no meio de uma resposta entra na fila e é respondida logo depois
+if prompt:
+    st.session_state.perguntas_pendentes.append(prompt)
+if st.session_state.geracao_ativa:
+    if prompt:
+        st.toast("Anotei sua pergunta! Respondo assim que terminar a anterior 🐾")
+    prompt = None
+elif st.session_state.perguntas_pendentes:
+    prompt = st.session_state.perguntas_pendentes.pop(0)
+
 if prompt:
     # Registra a pergunta do usuário
     registrar_atividade_academica(
@@ -256,89 +524,84 @@ if prompt:
     # Mostra mensagem do usuário
     with st.chat_message("user", avatar=avatar_user):
         st.write(prompt)
-
-    # Processa resposta do assistente
-    with st.chat_message("assistant", avatar=avatar_assistant):
+    
+    # Salva a pergunta (e cria o chat, se for novo) antes de gerar a resposta,
+    # para que a resposta tenha onde ser gravada em segundo plano
+    chat_criado = salvar_mensagens_pendentes()
+    pergunta_salva = st.session_state.mensagens_persistidas == len(st.session_state.mensagens)
+    
+    # Só resume se não houver outro resumo em andamento
+    resumo_chat = dict(st.session_state.resumo_chat) if st.session_state.tarefa_resumo is None else None
+    
+    # Perguntas genéricas (primeira da conversa, sem citar os pets) podem vir do cache, sem chamar o modelo
+    termos_privados = [pet["nome"] for pet in obter_pets()] + [nome_usuario, (perfil or {}).get("nome_completo")]
+    busca_cache = None
+    if pode_usar_cache(prompt, st.session_state.mensagens, termos_privados):
+        busca_cache = buscar_resposta(prompt)
+    
+    if busca_cache and busca_cache["resposta"]:
+        responder_do_cache(busca_cache["resposta"], busca_cache["similaridade"], chat_criado, resumo_chat)
+    else:
         try:
-            # Prepara o sistema prompt personalizado para Dr. Tobias
-            system_prompt = obter_system_prompt(perfil)
-
-            # Prepara mensagens para a API
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Adiciona apenas as últimas 10 mensagens para manter contexto sem ultrapassar limites
-            recent_messages = st.session_state.mensagens[-10:]
-            for msg in recent_messages:
-                if msg["role"] != "system":
-                    messages.append({
-                        "role": msg["role"], 
-                        "content": msg["content"]
-                    })
-            
-            # Chama a API da OpenAI
-            resposta_stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
+            if busca_cache:
+                # A resposta vai para o cache e pode ser mostrada a outros usuários: é gerada só com
+                # as instruções fixas e a pergunta, sem perfil, resumo dos pets ou saudação com o nome
+                system_prompt = PROMPT_ESTATICO
+                mensagens_contexto = st.session_state.mensagens[-1:]
+                resumo = {"resumo": None, "resumo_ate": 0}
+            else:
+                # Prepara o sistema prompt personalizado para Dr. Tobias
+                system_prompt = obter_system_prompt(perfil)
+                mensagens_contexto = st.session_state.mensagens
+                resumo = st.session_state.resumo_chat
+
+            # Prepara a requisição: instruções fixas, dados do usuário, resumo e o máximo de histórico
+            # que couber no orçamento de tokens (nessa ordem, para aproveitar o cache de prompt)
+            requisicao, info_contexto = montar_requisicao_chat(
+                system_prompt,
+                mensagens_contexto,
+                resumo=resumo["resumo"],
+                resumo_ate=resumo["resumo_ate"],
                 temperature=0.8,  # Um pouco mais criativa para conselhos amorosos
-                max_tokens=1000,
-                stream=True
+                max_tokens=1000
             )
-            
-            # Exibe resposta em tempo real
-            resposta_completa = ""
-            container = st.empty()
-            
-            for chunk in resposta_stream:
-                if chunk.choices[0].delta.content is not None:
-                    resposta_completa += chunk.choices[0].delta.content
-                    container.markdown(resposta_completa + "▌")
-            
-            # Remove o cursor e mostra resposta final
-            container.markdown(resposta_completa)
-            
-            # Adiciona resposta ao histórico
-            st.session_state.mensagens.append({
-                "role": "assistant",
-                "content": resposta_completa
-            })
-            
-            # SALVAMENTO AUTOMÁTICO APÓS CADA RESPOSTA
-            # Se não há chat ativo, cria um novo
-            if st.session_state.chat_ativo_id is None:
-                # Gera título da conversa baseado no conteúdo
-                try:
-                    titulo = gerar_titulo_chat(st.session_state.mensagens)
-                    if not titulo:
-                        titulo = f"Conversa de {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                except:
-                    titulo = f"Conversa de {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                
-                # Salva a nova conversa
-                chat_id = salvar_chat(titulo, st.session_state.mensagens)
-                if chat_id:
-                    st.session_state.chat_ativo_id = chat_id
-                    st.session_state.chat_ativo_nome = titulo
-                    registrar_acao_usuario("Nova Conversa Salva", f"Conversa salva automaticamente: {titulo}")
-            else:
-                # Atualiza conversa existente
-                atualizar_chat(st.session_state.chat_ativo_id, st.session_state.mensagens)
-                registrar_acao_usuario("Conversa Atualizada", f"Conversa {st.session_state.chat_ativo_nome} atualizada")
-            
-            # Registra a resposta
-            registrar_atividade_academica(
-                tipo="chatbot_dr_tobias",
-                modulo="Assistente Veterinário",
-                detalhes={
-                    "acao": "resposta",
-                    "tamanho_resposta": len(resposta_completa),
-                    "chat_id": st.session_state.chat_ativo_id,
-                    "chat_nome": st.session_state.chat_ativo_nome
-                }
+            print(
+                f"Contexto do chat: {info_contexto['tokens_prompt']}/{info_contexto['orcamento']} tokens, "
+                f"{info_contexto['mensagens_incluidas']}/{info_contexto['mensagens_total']} mensagens"
+            )
+        
+            # A resposta é gerada fora da execução do script: um clique no meio não a interrompe.
+            # Os dados da sessão ficam com a geração, para que uma sessão nova possa retomá-la
+            dados_sessao = {
+                "chat_id": st.session_state.chat_ativo_id,
+                "chat_criado": chat_criado,
+                "resumo_chat": resumo_chat,
+                "info_contexto": info_contexto
+            }
+            geracao_id = iniciar_geracao(
+                st.user.email,
+                st.session_state.chat_ativo_id if pergunta_salva else None,
+                st.session_state.mensagens_persistidas,
+                requisicao,
+                list(st.session_state.mensagens),
+                gerar_titulo=chat_criado,
+                resumo_chat=resumo_chat,
+                cache_resposta={"consulta": busca_cache["consulta"], "termos_privados": termos_privados} if busca_cache else None,
+                dados_sessao=dados_sessao
             )
-            
+            st.session_state.geracao_ativa = {"id": geracao_id, **dados_sessao}
         except Exception as e:
-            st.error(f"Ops! Tive um probleminha técnico: {str(e)}")
-            st.error("Tenta novamente, por favor! 🐾")
+            with st.chat_message("assistant", avatar=avatar_assistant):
+                st.error(f"Ops! Tive um probleminha técnico: {str(e)}")
+                st.error("Tenta novamente, por favor! 🐾")
+
+# Exibe a resposta em andamento (também depois de um rerun no meio da geração)
+if st.session_state.geracao_ativa:
+    acompanhar_resposta()
+
+# Responde a próxima pergunta da fila
+if st.session_state.perguntas_pendentes and not st.session_state.geracao_ativa:
+    st.rerun()
 
 # Informações úteis na sidebar
 with st.sidebar:
@@ -0,0 +1,213 @@
+import os
+import threading
+import streamlit as st
+from paginas.llms import MODELO_PADRAO, gerar_resumo_conversa
+from paginas.funcoes import salvar_resumo_chat
+
+# tiktoken é opcional: sem ele a contagem de tokens é estimada pelo tamanho do texto
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Máximo de tokens enviados ao modelo por pergunta (system prompt + resumo + histórico)
+ORCAMENTO_TOKENS = int(os.environ.get("DR_TOBIAS_ORCAMENTO_TOKENS", "6000"))
+
+# Tokens extras que a API cobra por mensagem (papel e separadores)
+TOKENS_POR_MENSAGEM = 4
+
+# Estimativa usada quando não há tokenizador disponível (português fica perto de 4 caracteres por token)
+CARACTERES_POR_TOKEN = 4
+
+# Resumo contínuo: as mensagens mais recentes ficam sempre fora do resumo, e as
+# anteriores só são resumidas quando se acumulam pelo menos LOTE_RESUMO delas
+MENSAGENS_RECENTES = 6
+LOTE_RESUMO = 4
+
+# Uso de tokens informado pela API, acumulado no processo
+_trava = threading.Lock()
+_estatisticas = {"requisicoes": 0, "tokens_prompt": 0, "tokens_cache": 0}
+
+
+@st.cache_resource(show_spinner=False)
+def _obter_codificador(modelo):
+    """Carrega o tokenizador do modelo uma vez por processo (None se não estiver disponível)."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(modelo)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Na primeira execução o tiktoken baixa as tabelas; sem rede, usa a estimativa
+        print(f"Tokenizador indisponível, usando estimativa por caracteres: {e}")
+        return None
+
+def contar_tokens(texto, modelo=MODELO_PADRAO):
+    """
+    Conta os tokens de um texto para o modelo informado.
+
+    Returns:
+        int: Número de tokens (exato com tiktoken, estimado sem ele)
+    """
+    codificador = _obter_codificador(modelo)
+    if codificador is None:
+        return len(texto) // CARACTERES_POR_TOKEN + 1
+    return len(codificador.encode(texto))
+
+def _tokens_mensagem(mensagem, modelo):
+    return contar_tokens(mensagem["content"], modelo) + TOKENS_POR_MENSAGEM
+
+def montar_contexto(system_prompt, mensagens, resumo=None, resumo_ate=0, orcamento=ORCAMENTO_TOKENS, modelo=MODELO_PADRAO):
+    """
+    Monta a lista de mensagens enviada ao modelo respeitando um orçamento de tokens.
+
+    O system prompt e a última mensagem (a pergunta atual) sempre entram. Se houver
+    um resumo da conversa e ele couber, vai anexado ao system prompt e substitui as
+    mensagens que resume. Em seguida o histórico restante é incluído da mensagem mais
+    recente para a mais antiga enquanto couber.
+
+    Args:
+        system_prompt: Instruções do assistente
+        mensagens: Histórico completo da conversa (a última é a pergunta atual)
+        resumo: Resumo das mensagens mais antigas (opcional)
+        resumo_ate: Número de mensagens (a partir do início) cobertas pelo resumo
+        orcamento: Máximo de tokens de entrada
+        modelo: Modelo usado para contar os tokens
+
+    Returns:
+        tuple: (lista de mensagens para a API, dict com o tamanho do prompt e o que foi incluído)
+    """
+    total_mensagens = len([msg for msg in mensagens if msg["role"] != "system"])
+    usados = contar_tokens(system_prompt, modelo) + TOKENS_POR_MENSAGEM
+
+    resumo_incluido = False
+    if resumo and resumo_ate > 0:
+        trecho_resumo = f"\n\nRESUMO DA CONVERSA ATÉ AQUI (mensagens anteriores que não estão no histórico):\n{resumo}"
+        tokens_resumo = contar_tokens(trecho_resumo, modelo)
+        if usados + tokens_resumo + _tokens_mensagem(mensagens[-1], modelo) <= orcamento:
+            system_prompt += trecho_resumo
+            usados += tokens_resumo
+            resumo_incluido = True
+            # A pergunta atual nunca faz parte do resumo
+            mensagens = mensagens[min(resumo_ate, len(mensagens) - 1):]
+
+    historico = [msg for msg in mensagens if msg["role"] != "system"]
+    incluidas = []
+    for posicao, mensagem in enumerate(reversed(historico)):
+        tokens = _tokens_mensagem(mensagem, modelo)
+        # A pergunta atual entra mesmo que estoure o orçamento
+        if posicao > 0 and usados + tokens > orcamento:
+            break
+        usados += tokens
+        incluidas.append(mensagem)
+    incluidas.reverse()
+
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend({"role": msg["role"], "content": msg["content"]} for msg in incluidas)
+
+    info = {
+        "tokens_prompt": usados,
+        "orcamento": orcamento,
+        "mensagens_incluidas": len(incluidas),
+        "mensagens_total": total_mensagens,
+        "resumo_incluido": resumo_incluido,
+        "tokens_estimados": _obter_codificador(modelo) is None,
+    }
+    return messages, info
+
+def montar_requisicao_chat(system_prompt, mensagens, resumo=None, resumo_ate=0, **parametros):
+    """
+    Monta os argumentos de client.chat.completions.create para uma resposta do chat.
+
+    A ordem do conteúdo favorece o cache de prompt da OpenAI, que reaproveita o maior
+    prefixo já visto: instruções fixas e dados do usuário (ambos já em system_prompt,
+    nessa ordem), depois o resumo da conversa e, por fim, o histórico. O stream pede
+    o uso de tokens no último pedaço, lido por registrar_uso_tokens.
+
+    Args:
+        system_prompt: Prompt do usuário (obter_system_prompt)
+        mensagens: Histórico completo da conversa (a última é a pergunta atual)
+        resumo: Resumo das mensagens mais antigas (opcional)
+        resumo_ate: Número de mensagens cobertas pelo resumo
+        **parametros: Demais argumentos da API (temperature, max_tokens...)
+
+    Returns:
+        tuple: (argumentos da requisição, dict com o tamanho do prompt e o que foi incluído)
+    """
+    messages, info = montar_contexto(system_prompt, mensagens, resumo=resumo, resumo_ate=resumo_ate)
+    requisicao = {
+        "model": MODELO_PADRAO,
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        **parametros
+    }
+    return requisicao, info
+
+def registrar_uso_tokens(uso):
+    """
+    Lê o uso de tokens de uma resposta e soma às estatísticas do processo.
+
+    Args:
+        uso: Objeto 'usage' da API (último pedaço do stream)
+
+    Returns:
+        dict: tokens do prompt, tokens do prompt vindos do cache e tokens da resposta
+    """
+    if uso is None:
+        return {}
+
+    detalhes = getattr(uso, "prompt_tokens_details", None)
+    tokens_cache = getattr(detalhes, "cached_tokens", None) or 0
+
+    with _trava:
+        _estatisticas["requisicoes"] += 1
+        _estatisticas["tokens_prompt"] += uso.prompt_tokens
+        _estatisticas["tokens_cache"] += tokens_cache
+
+    return {
+        "tokens_prompt_api": uso.prompt_tokens,
+        "tokens_cache": tokens_cache,
+        "tokens_resposta": uso.completion_tokens,
+    }
+
+def obter_estatisticas_prompt():
+    """
+    Retorna o uso de tokens acumulado pelo chat neste processo.
+
+    Returns:
+        dict: requisições, tokens de prompt, tokens vindos do cache e taxa de acerto do cache
+    """
+    with _trava:
+        total = _estatisticas["tokens_prompt"]
+        return {
+            **_estatisticas,
+            "taxa_cache": _estatisticas["tokens_cache"] / total if total else 0.0,
+        }
+
+def precisa_resumir(num_mensagens, resumo_ate):
+    """Indica se há mensagens antigas suficientes fora do resumo para valer uma nova rodada."""
+    return num_mensagens - MENSAGENS_RECENTES - resumo_ate >= LOTE_RESUMO
+
+def resumir_conversa(email, chat_id, mensagens, resumo, resumo_ate):
+    """
+    Incorpora ao resumo do chat as mensagens antigas ainda não resumidas e grava o resultado.
+
+    Feita para rodar em segundo plano (agendar_tarefa) depois que a resposta já foi exibida.
+
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        mensagens: Cópia do histórico completo da conversa
+        resumo: Resumo atual (ou None)
+        resumo_ate: Número de mensagens cobertas pelo resumo atual
+
+    Returns:
+        dict: chat_id, resumo e resumo_ate novos, ou None se falhou
+    """
+    novo_resumo_ate = len(mensagens) - MENSAGENS_RECENTES
+    novo_resumo = gerar_resumo_conversa(resumo, mensagens[resumo_ate:novo_resumo_ate])
+    if not novo_resumo or not salvar_resumo_chat(email, chat_id, novo_resumo, novo_resumo_ate):
+        return None
+    return {"chat_id": chat_id, "resumo": novo_resumo, "resumo_ate": novo_resumo_ate}
@@ -0,0 +1,58 @@
+import time
+
+# Renderização da resposta durante o streaming: no máximo uma atualização da tela
+# a cada INTERVALO_RENDERIZACAO segundos ou a cada PEDACOS_POR_RENDERIZACAO pedaços
+INTERVALO_RENDERIZACAO = 0.1
+PEDACOS_POR_RENDERIZACAO = 20
+CURSOR = "▌"
+
+# Histórico do chat: quantas mensagens são exibidas de cada vez
+MENSAGENS_POR_PAGINA = 30
+
+
+def criar_renderizador(container, intervalo=INTERVALO_RENDERIZACAO, max_pedacos=PEDACOS_POR_RENDERIZACAO):
+    """
+    Cria a função que atualiza o texto de uma resposta em streaming sem redesenhar a cada pedaço.
+
+    Cada container.markdown reenvia e reprocessa a resposta inteira, então os pedaços
+    são acumulados e a tela só é atualizada quando passa o intervalo ou o número de
+    pedaços. O primeiro pedaço aparece na hora, e a chamada final sempre desenha o texto completo.
+    Se o modelo fizer uma pausa, atualizar.descarregar() desenha o texto que ficou guardado.
+
+    Args:
+        container: Elemento do Streamlit onde o texto é exibido (ex: st.empty())
+        intervalo: Tempo mínimo (em segundos) entre duas atualizações
+        max_pedacos: Número de pedaços que força uma atualização antes do intervalo
+
+    Returns:
+        function: atualizar(texto, final=False), com o método descarregar(); o atributo
+                  'renderizacoes' conta as atualizações feitas
+    """
+    estado = {"ultima": float("-inf"), "pendentes": 0, "texto": ""}
+
+    def desenhar(texto, final):
+        container.markdown(texto if final else texto + CURSOR)
+        estado["ultima"] = time.monotonic()
+        estado["pendentes"] = 0
+        atualizar.renderizacoes += 1
+
+    def atualizar(texto, final=False):
+        estado["pendentes"] += 1
+        estado["texto"] = texto
+        if not final and estado["pendentes"] < max_pedacos and time.monotonic() - estado["ultima"] < intervalo:
+            return
+        desenhar(texto, final)
+
+    def descarregar():
+        """Desenha o texto guardado, se algum pedaço ainda não apareceu na tela."""
+        if estado["pendentes"]:
+            desenhar(estado["texto"], final=False)
+
+    atualizar.descarregar = descarregar
+    atualizar.renderizacoes = 0
+    return atualizar
+
+def formatar_resposta(conteudo):
+    """Converte as fórmulas do modelo (\\[ \\] e \\( \\)) para o formato de matemática do Streamlit."""
+    return conteudo.replace('\\[', '$$').replace('\\]', '$$')\
+                   .replace('\\(', '$').replace('\\)', '$')
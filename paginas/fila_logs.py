@@ -0,0 +1,107 @@
+import atexit
+import queue
+import threading
+import time
+
+# Limites da fila de logs em segundo plano
+TAMANHO_MAXIMO_FILA = 1000   # Eventos acima disso são descartados (a fila nunca bloqueia o usuário)
+TAMANHO_LOTE = 100           # Máximo de eventos por batch (o Firestore aceita até 500 operações)
+INTERVALO_DESCARGA = 2.0     # Segundos máximos que um evento espera pelo próximo batch
+ESPERA_NOVA_TENTATIVA = 1.0  # Pausa antes de gravar de novo um lote que falhou
+TEMPO_ESPERA_ENCERRAMENTO = 10.0
+
+_fila = queue.Queue(maxsize=TAMANHO_MAXIMO_FILA)
+_parar = threading.Event()
+_trava = threading.Lock()
+_estado = {"thread": None}
+_estatisticas = {"enfileirados": 0, "gravados": 0, "descartados": 0, "falhas": 0}
+
+
+def enfileirar_evento(db, doc_ref, dados):
+    """
+    Agenda a gravação de um documento de log sem bloquear quem chamou.
+
+    Se a fila estiver cheia, o evento é descartado e contabilizado em 'descartados'.
+
+    Args:
+        db: Cliente do Firestore (usado para os batches)
+        doc_ref: Referência do documento a ser criado (ex: colecao.document())
+        dados: Dicionário com os dados do log
+    """
+    _garantir_worker(db)
+    try:
+        _fila.put_nowait((doc_ref, dados))
+        with _trava:
+            _estatisticas["enfileirados"] += 1
+    except queue.Full:
+        with _trava:
+            _estatisticas["descartados"] += 1
+
+def obter_estatisticas_logs():
+    """
+    Retorna os contadores da fila de logs.
+
+    Returns:
+        dict: enfileirados, gravados, descartados, falhas e tamanho atual da fila
+    """
+    with _trava:
+        return {**_estatisticas, "pendentes": _fila.qsize()}
+
+def _garantir_worker(db):
+    """Inicia a thread de gravação na primeira vez que um evento é enfileirado."""
+    with _trava:
+        thread = _estado["thread"]
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=_executar_worker, args=(db,), name="fila-logs", daemon=True)
+        _estado["thread"] = thread
+        thread.start()
+
+def _executar_worker(db):
+    """Junta eventos em lotes (por tamanho ou tempo) e grava cada lote em um único batch."""
+    while not (_parar.is_set() and _fila.empty()):
+        try:
+            lote = [_fila.get(timeout=0.5)]
+        except queue.Empty:
+            continue
+
+        prazo = time.monotonic() + INTERVALO_DESCARGA
+        while len(lote) < TAMANHO_LOTE:
+            # No encerramento não espera o prazo: só esvazia o que já está na fila
+            restante = 0 if _parar.is_set() else prazo - time.monotonic()
+            try:
+                if restante > 0:
+                    lote.append(_fila.get(timeout=restante))
+                else:
+                    lote.append(_fila.get_nowait())
+            except queue.Empty:
+                break
+
+        _gravar_lote(db, lote)
+
+def _gravar_lote(db, lote):
+    """Grava o lote em um batch, com uma nova tentativa; se falhar de novo, os eventos são perdidos."""
+    for tentativa in range(2):
+        try:
+            batch = db.batch()
+            for doc_ref, dados in lote:
+                batch.set(doc_ref, dados)
+            batch.commit()
+            with _trava:
+                _estatisticas["gravados"] += len(lote)
+            return
+        except Exception as e:
+            print(f"Erro ao gravar lote de {len(lote)} logs (tentativa {tentativa + 1}): {e}")
+            if tentativa == 0:
+                time.sleep(ESPERA_NOVA_TENTATIVA)
+
+    with _trava:
+        _estatisticas["falhas"] += len(lote)
+
+@atexit.register
+def descarregar_eventos():
+    """Ao encerrar o processo, sinaliza o worker e espera ele gravar o que restou na fila."""
+    _parar.set()
+    thread = _estado["thread"]
+    if thread is not None and thread.is_alive():
+        thread.join(timeout=TEMPO_ESPERA_ENCERRAMENTO)
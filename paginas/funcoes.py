@@ -4,28 +4,49 @@ import streamlit as st
 from firebase_admin import firestore, credentials, storage
 import firebase_admin
 import uuid
+import time
+import hashlib
+import json
 from PIL import Image
 import io
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as ReportLabImage
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image as ReportLabImage
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pypdf import PdfReader, PdfWriter
+from paginas.cache import cache_por_usuario, invalidar_cache
+from paginas.fila_logs import enfileirar_evento
+from paginas.cache_arquivos import obter_arquivo, ler_arquivo, buscar_arquivo_gerado, gravar_arquivo_gerado, arquivos_em_uso
+from paginas.prompts import VERSAO_TEMPLATE, montar_system_prompt
 
 # Nome da coleção principal de usuários definida como variável global
 COLECAO_USUARIOS = "Dr-Tobias"
 
+# Número máximo de consultas simultâneas ao buscar exames de vários pets
+MAX_CONSULTAS_PARALELAS = 8
 
+# Quantidade de conversas carregadas por vez na barra lateral
+CHATS_POR_PAGINA = 20
 
+# Downloads simultâneos (foto e PDFs dos exames) ao montar o relatório do pet
+MAX_DOWNLOADS_PARALELOS = 6
+TIMEOUT_DOWNLOAD = (5, 30)  # (conexão, leitura) em segundos, por arquivo
+
+
+
+@st.cache_resource(show_spinner=False)
 def inicializar_firebase():
+    # Executa uma única vez por processo: os reruns seguintes reaproveitam o app já configurado
     # Usa APENAS as informações do secrets.toml - sem dependência de arquivo JSON
     if 'firebase' not in st.secrets:
         raise ValueError("Configuração do Firebase não encontrada no secrets.toml")
         
     print("Inicializando Firebase com secrets do Streamlit...")
+    inicio = time.perf_counter()
     
     project_id = st.secrets.firebase.project_id
     # GARANTINDO que usa o bucket correto: .firebasestorage.app
@@ -69,6 +90,27 @@ def inicializar_firebase():
             'storageBucket': storage_bucket
         })
         print("🔥 Firebase inicializado com sucesso com bucket correto!")
+    
+    print(f"⏱️ Inicialização do Firebase levou {time.perf_counter() - inicio:.3f}s")
+
+@st.cache_resource(show_spinner=False)
+def obter_db():
+    """
+    Retorna o cliente do Firestore compartilhado pelo processo.
+    
+    O cliente (e seu canal gRPC) é criado uma única vez e reutilizado por todas
+    as sessões e threads.
+    """
+    inicializar_firebase()
+    return firestore.client()
+
+@st.cache_resource(show_spinner=False)
+def obter_bucket():
+    """
+    Retorna o bucket do Firebase Storage compartilhado pelo processo.
+    """
+    inicializar_firebase()
+    return storage.bucket()
 
 def login_usuario():
     """
@@ -79,7 +121,7 @@ def login_usuario():
     if not hasattr(st.user, 'email'):
         return False # Se não houver email, não tenta registrar o usuário
         
-    db = firestore.client()
+    db = obter_db()
     doc_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
     doc = doc_ref.get()
 
@@ -103,6 +145,7 @@ def login_usuario():
             "primeiro_acesso_concluido": False # Flag para o formulário inicial
         }
         doc_ref.set(dados_usuario)
+        invalidar_cache(st.user.email, "obter_perfil_usuario")
         registrar_acao_usuario("Cadastro", "Novo usuário registrado")
         if 'login_registrado' not in st.session_state:
              st.session_state['login_registrado'] = True # Marca como registrado para evitar loop
@@ -114,6 +157,8 @@ def login_usuario():
             st.session_state['login_registrado'] = True
         return False # Indica que não é o primeiro login
 
+# Os registros abaixo não gravam na hora: entram na fila de paginas/fila_logs.py,
+# que os grava em segundo plano, em lotes, para não atrasar a página
 def registrar_acao_usuario(acao: str, detalhes: str = ""):
     """
     Registra uma ação do usuário no Firestore.
@@ -125,7 +170,7 @@ def registrar_acao_usuario(acao: str, detalhes: str = ""):
     if not hasattr(st.user, 'email'):
         return  # Se não houver email, não registra a ação
         
-    db = firestore.client()
+    db = obter_db()
     logs_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("logs")
     
     dados_log = {
@@ -134,7 +179,7 @@ def registrar_acao_usuario(acao: str, detalhes: str = ""):
         "data_hora": datetime.now()
     }
     
-    logs_ref.add(dados_log)
+    enfileirar_evento(db, logs_ref.document(), dados_log)
 
 def registrar_atividade_academica(tipo: str, modulo: str, detalhes: dict):
     """
@@ -148,7 +193,7 @@ def registrar_atividade_academica(tipo: str, modulo: str, detalhes: dict):
     if not hasattr(st.user, 'email'):
         return
         
-    db = firestore.client()
+    db = obter_db()
     atividades_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("atividades_academicas")
     
     dados_atividade = {
@@ -158,8 +203,9 @@ def registrar_atividade_academica(tipo: str, modulo: str, detalhes: dict):
         "data_hora": datetime.now()
     }
     
-    atividades_ref.add(dados_atividade)
+    enfileirar_evento(db, atividades_ref.document(), dados_atividade)
 
+@cache_por_usuario()
 def obter_perfil_usuario():
     """
     Obtém os dados de perfil do usuário atual do Firestore.
@@ -170,7 +216,7 @@ def obter_perfil_usuario():
     if not hasattr(st.user, 'email'):
         return None
         
-    db = firestore.client()
+    db = obter_db()
     doc_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
     try:
         doc = doc_ref.get()
@@ -186,6 +232,11 @@ def obter_perfil_usuario():
                 "experiencia_pets": dados.get("experiencia_pets", ""),
                 "tipos_pets": dados.get("tipos_pets", []),
                 "situacao_atual": dados.get("situacao_atual", ""),
+                # Contexto do chatbot (resumo dos pets e system prompt já montado)
+                "resumos_pet": dados.get("resumos_pet", ""),
+                "system_prompt": dados.get("system_prompt", ""),
+                "system_prompt_versao": dados.get("system_prompt_versao", ""),
+                "system_prompt_template": dados.get("system_prompt_template", ""),
                 # Flag de controle
                 "primeiro_acesso_concluido": dados.get("primeiro_acesso_concluido", False),
                 # Campos derivados do Google (mantidos para referência, se útil)
@@ -216,20 +267,97 @@ def atualizar_perfil_usuario(dados_perfil):
     if not hasattr(st.user, 'email'):
         return False  # Retorna False se não houver email
         
-    db = firestore.client()
+    db = obter_db()
     doc_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
     
     try:
-        doc_ref.update(dados_perfil)
+        _atualizar_usuario_e_system_prompt(doc_ref, dados_perfil)
+        invalidar_cache(st.user.email, "obter_perfil_usuario")
         return True
     except Exception as e:
         print(f"Erro ao atualizar perfil para {st.user.email}: {e}")
         return False
 
+def _atualizar_usuario_e_system_prompt(doc_ref, alteracoes):
+    """
+    Atualiza o documento do usuário e, na mesma escrita, o system prompt montado a partir dele.
+    
+    Args:
+        doc_ref: Referência do documento do usuário
+        alteracoes: Campos do perfil a atualizar (ex: dados do formulário, resumos_pet)
+    """
+    dados = doc_ref.get().to_dict() or {}
+    dados.update(alteracoes)
+    texto, versao = montar_system_prompt(dados)
+    doc_ref.update({
+        **alteracoes,
+        "system_prompt": texto,
+        "system_prompt_versao": versao,
+        "system_prompt_template": VERSAO_TEMPLATE
+    })
+
+def obter_system_prompt(perfil):
+    """
+    Retorna o system prompt do Dr. Tobias para o usuário atual.
+    
+    O prompt é montado quando o perfil ou os pets mudam e fica gravado no documento
+    do usuário; aqui ele só é reaproveitado. Perfis antigos (sem prompt gravado) ou
+    gravados com um modelo de prompt anterior são montados e gravados na hora.
+    
+    Args:
+        perfil: Dicionário retornado por obter_perfil_usuario()
+        
+    Returns:
+        str: Texto do system prompt
+    """
+    if perfil.get("system_prompt") and perfil.get("system_prompt_template") == VERSAO_TEMPLATE:
+        return perfil["system_prompt"]
+    
+    texto, versao = montar_system_prompt(perfil)
+    if not hasattr(st.user, 'email'):
+        return texto
+    
+    db = obter_db()
+    doc_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
+    try:
+        doc_ref.update({
+            "system_prompt": texto,
+            "system_prompt_versao": versao,
+            "system_prompt_template": VERSAO_TEMPLATE
+        })
+        invalidar_cache(st.user.email, "obter_perfil_usuario")
+    except Exception as e:
+        print(f"Erro ao gravar system prompt para {st.user.email}: {e}")
+    return texto
+
+def _gravar_mensagens_chat(batch, chat_ref, mensagens, ordem_inicial):
+    """
+    Adiciona ao batch um documento por mensagem na subcoleção 'mensagens' do chat.
+    
+    O ID do documento é a ordem da mensagem com zeros à esquerda, de modo que
+    regravar a mesma mensagem (ex: nova tentativa) não a duplica.
+    
+    Args:
+        batch: WriteBatch do Firestore
+        chat_ref: Referência do documento do chat
+        mensagens: Lista de mensagens a gravar
+        ordem_inicial: Posição da primeira mensagem na conversa
+    """
+    for ordem, mensagem in enumerate(mensagens, ordem_inicial):
+        batch.set(chat_ref.collection("mensagens").document(f"{ordem:06d}"), {
+            "ordem": ordem,
+            "role": mensagem["role"],
+            "content": mensagem["content"],
+            "data_hora": datetime.now()
+        })
+
 def salvar_chat(nome_chat, mensagens):
     """
     Salva um chat no Firestore.
     
+    O documento do chat guarda apenas os metadados; cada mensagem vira um
+    documento da subcoleção 'mensagens'.
+    
     Args:
         nome_chat: Nome do chat
         mensagens: Lista de mensagens do chat
@@ -240,26 +368,39 @@ def salvar_chat(nome_chat, mensagens):
     if not hasattr(st.user, 'email'):
         return None
         
-    db = firestore.client()
-    chats_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats")
+    db = obter_db()
+    chat_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats").document()
     
     try:
         dados_chat = {
             "nome": nome_chat,
-            "mensagens": mensagens,
+            "num_mensagens": len(mensagens),
             "data_criacao": datetime.now(),
             "data_atualizacao": datetime.now()
         }
         
-        doc_ref = chats_ref.add(dados_chat)
-        return doc_ref[1].id  # Retorna o ID do documento criado
+        batch = db.batch()
+        batch.set(chat_ref, dados_chat)
+        _gravar_mensagens_chat(batch, chat_ref, mensagens, 0)
+        batch.commit()
+        invalidar_cache(st.user.email, "obter_chats")
+        return chat_ref.id  # Retorna o ID do documento criado
     except Exception as e:
         print(f"Erro ao salvar chat: {e}")
         return None
 
-def obter_chats():
+@cache_por_usuario(valor_erro=[])
+def obter_chats(limite=CHATS_POR_PAGINA, apos=None):
     """
-    Obtém a lista de chats do usuário atual.
+    Obtém uma página de chats do usuário atual, do mais recente para o mais antigo, apenas com metadados.
+    
+    A consulta projeta só os campos da listagem, então as mensagens de chats
+    antigos (guardadas no próprio documento) não são baixadas.
+    
+    Args:
+        limite: Número máximo de chats retornados
+        apos: data_atualizacao do último chat já carregado; a consulta começa
+              depois dele (cursor), sem reler as páginas anteriores
     
     Returns:
         list: Lista de dicionários com dados dos chats
@@ -267,11 +408,17 @@ def obter_chats():
     if not hasattr(st.user, 'email'):
         return []
         
-    db = firestore.client()
+    db = obter_db()
     chats_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats")
     
     try:
-        docs = chats_ref.order_by("data_atualizacao", direction=firestore.Query.DESCENDING).get()
+        consulta = (
+            chats_ref.select(["nome", "data_criacao", "data_atualizacao", "num_mensagens"])
+            .order_by("data_atualizacao", direction=firestore.Query.DESCENDING)
+        )
+        if apos is not None:
+            consulta = consulta.start_after({"data_atualizacao": apos})
+        docs = consulta.limit(limite).get()
         chats = []
         for doc in docs:
             chat_data = doc.to_dict()
@@ -279,16 +426,21 @@ def obter_chats():
                 "id": doc.id,
                 "nome": chat_data.get("nome", "Chat sem nome"),
                 "data_criacao": chat_data.get("data_criacao"),
-                "data_atualizacao": chat_data.get("data_atualizacao")
+                "data_atualizacao": chat_data.get("data_atualizacao"),
+                "num_mensagens": chat_data.get("num_mensagens")
             })
         return chats
     except Exception as e:
         print(f"Erro ao obter chats: {e}")
-        return []
+        raise
 
 def obter_chat(chat_id):
     """
-    Obtém um chat específico pelo ID.
+    Obtém um chat específico pelo ID, remontando o histórico de mensagens.
+    
+    Chats antigos guardam as mensagens no array 'mensagens' do próprio documento;
+    as mensagens novas ficam na subcoleção 'mensagens' e são lidas só aqui, ao
+    abrir a conversa, e anexadas depois das antigas.
     
     Args:
         chat_id: ID do chat a ser obtido
@@ -299,14 +451,28 @@ def obter_chat(chat_id):
     if not hasattr(st.user, 'email'):
         return None
         
-    db = firestore.client()
+    db = obter_db()
     chat_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats").document(chat_id)
     
     try:
         doc = chat_ref.get()
-        if doc.exists:
-            return doc.to_dict()
-        return None
+        if not doc.exists:
+            return None
+        
+        chat_data = doc.to_dict()
+        mensagens = list(chat_data.get("mensagens", []))
+        for msg_doc in chat_ref.collection("mensagens").order_by("ordem").get():
+            msg_data = msg_doc.to_dict()
+            mensagem = {
+                "role": msg_data.get("role"),
+                "content": msg_data.get("content", "")
+            }
+            # Resposta cuja geração foi interrompida (só o último checkpoint foi salvo)
+            if msg_data.get("parcial"):
+                mensagem["parcial"] = True
+            mensagens.append(mensagem)
+        chat_data["mensagens"] = mensagens
+        return chat_data
     except Exception as e:
         print(f"Erro ao obter chat {chat_id}: {e}")
         return None
@@ -324,23 +490,34 @@ def excluir_chat(chat_id):
     if not hasattr(st.user, 'email'):
         return False
         
-    db = firestore.client()
+    db = obter_db()
     chat_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats").document(chat_id)
     
     try:
-        chat_ref.delete()
+        # A subcoleção de mensagens não é removida junto com o documento
+        batch = db.batch()
+        for num_operacoes, msg_ref in enumerate(chat_ref.collection("mensagens").list_documents(), 1):
+            batch.delete(msg_ref)
+            if num_operacoes % 500 == 0:  # Limite de operações por batch
+                batch.commit()
+                batch = db.batch()
+        batch.delete(chat_ref)
+        batch.commit()
+        invalidar_cache(st.user.email, "obter_chats")
         return True
     except Exception as e:
         print(f"Erro ao excluir chat {chat_id}: {e}")
         return False
 
-def atualizar_chat(chat_id, mensagens):
+def atualizar_chat(chat_id, novas_mensagens, ordem_inicial):
     """
-    Atualiza um chat específico com novas mensagens.
+    Anexa novas mensagens a um chat existente, sem regravar o histórico.
     
     Args:
         chat_id: ID do chat a ser atualizado
-        mensagens: Lista atualizada de mensagens
+        novas_mensagens: Mensagens ainda não salvas (ex: par pergunta/resposta)
+        ordem_inicial: Posição da primeira nova mensagem na conversa
+            (número de mensagens já salvas)
         
     Returns:
         bool: True se atualização foi bem-sucedida, False caso contrário
@@ -348,19 +525,141 @@ def atualizar_chat(chat_id, mensagens):
     if not hasattr(st.user, 'email'):
         return False
         
-    db = firestore.client()
+    db = obter_db()
     chat_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("chats").document(chat_id)
     
     try:
-        chat_ref.update({
-            "mensagens": mensagens,
+        batch = db.batch()
+        _gravar_mensagens_chat(batch, chat_ref, novas_mensagens, ordem_inicial)
+        batch.update(chat_ref, {
+            "num_mensagens": ordem_inicial + len(novas_mensagens),
             "data_atualizacao": datetime.now()
         })
+        batch.commit()
+        invalidar_cache(st.user.email, "obter_chats")
         return True
     except Exception as e:
         print(f"Erro ao atualizar chat {chat_id}: {e}")
         return False
 
+def salvar_resposta_parcial(email, chat_id, ordem, conteudo):
+    """
+    Grava o que já foi gerado da resposta do assistente, marcado como parcial.
+    
+    Cada checkpoint é uma única escrita, sempre no mesmo documento; a gravação final
+    (salvar_resposta_chat) substitui esse documento e remove a marca. Chamada em
+    segundo plano, por isso recebe o email em vez de usar st.user.
+    
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        ordem: Posição da resposta na conversa
+        conteudo: Texto gerado até o momento
+        
+    Returns:
+        bool: True se gravado com sucesso, False caso contrário
+    """
+    db = obter_db()
+    chat_ref = db.collection(COLECAO_USUARIOS).document(email).collection("chats").document(chat_id)
+    
+    try:
+        chat_ref.collection("mensagens").document(f"{ordem:06d}").set({
+            "ordem": ordem,
+            "role": "assistant",
+            "content": conteudo,
+            "parcial": True,
+            "data_hora": datetime.now()
+        })
+        return True
+    except Exception as e:
+        print(f"Erro ao salvar resposta parcial do chat {chat_id}: {e}")
+        return False
+
+def salvar_resposta_chat(email, chat_id, ordem, conteudo):
+    """
+    Grava a resposta completa do assistente (substituindo o último checkpoint) e atualiza o chat.
+    
+    Chamada em segundo plano, por isso recebe o email em vez de usar st.user.
+    
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        ordem: Posição da resposta na conversa
+        conteudo: Texto da resposta
+        
+    Returns:
+        bool: True se gravado com sucesso, False caso contrário
+    """
+    db = obter_db()
+    chat_ref = db.collection(COLECAO_USUARIOS).document(email).collection("chats").document(chat_id)
+    
+    try:
+        batch = db.batch()
+        _gravar_mensagens_chat(batch, chat_ref, [{"role": "assistant", "content": conteudo}], ordem)
+        batch.update(chat_ref, {
+            "num_mensagens": ordem + 1,
+            "data_atualizacao": datetime.now()
+        })
+        batch.commit()
+        invalidar_cache(email, "obter_chats")
+        return True
+    except Exception as e:
+        print(f"Erro ao salvar resposta do chat {chat_id}: {e}")
+        return False
+
+def atualizar_titulo_chat(email, chat_id, titulo):
+    """
+    Troca o nome de um chat (ex: título provisório pelo gerado pelo modelo).
+    
+    Chamada em segundo plano, por isso recebe o email em vez de usar st.user.
+    
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        titulo: Novo nome do chat
+        
+    Returns:
+        bool: True se atualizado com sucesso, False caso contrário
+    """
+    db = obter_db()
+    chat_ref = db.collection(COLECAO_USUARIOS).document(email).collection("chats").document(chat_id)
+    
+    try:
+        chat_ref.update({"nome": titulo})
+        invalidar_cache(email, "obter_chats")
+        return True
+    except Exception as e:
+        print(f"Erro ao atualizar título do chat {chat_id}: {e}")
+        return False
+
+def salvar_resumo_chat(email, chat_id, resumo, resumo_ate):
+    """
+    Grava no documento do chat o resumo das mensagens mais antigas.
+    
+    Chamada em segundo plano, por isso recebe o email em vez de usar st.user.
+    
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        resumo: Texto do resumo
+        resumo_ate: Número de mensagens (a partir do início) cobertas pelo resumo
+        
+    Returns:
+        bool: True se gravado com sucesso, False caso contrário
+    """
+    db = obter_db()
+    chat_ref = db.collection(COLECAO_USUARIOS).document(email).collection("chats").document(chat_id)
+    
+    try:
+        chat_ref.update({
+            "resumo": resumo,
+            "resumo_ate": resumo_ate
+        })
+        return True
+    except Exception as e:
+        print(f"Erro ao salvar resumo do chat {chat_id}: {e}")
+        return False
+
 # ============================================================================
 # FUNÇÕES PARA GERENCIAMENTO DE PETS
 # ============================================================================
@@ -457,7 +756,7 @@ def fazer_upload_imagem_pet(imagem_file, pet_id, pet_nome):
         img_bytes.seek(0)
         
         # Upload para Firebase Storage
-        bucket = storage.bucket()
+        bucket = obter_bucket()
         blob = bucket.blob(nome_arquivo)
         blob.upload_from_file(img_bytes, content_type=f'image/{extensao}')
         
@@ -497,7 +796,7 @@ def salvar_pet(nome, especie, idade, raca, sexo, castrado, peso, altura, histori
     if not hasattr(st.user, 'email'):
         return None
         
-    db = firestore.client()
+    db = obter_db()
     pets_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets")
     
     try:
@@ -525,11 +824,13 @@ def salvar_pet(nome, especie, idade, raca, sexo, castrado, peso, altura, histori
         
         # Salvando pet no Firestore
         doc_ref = pets_ref.add(dados_pet)
+        invalidar_cache(st.user.email, "obter_pets")
         return doc_ref[1].id  # Retorna o ID do documento criado
     except Exception as e:
         print(f"Erro ao salvar pet: {e}")
         return None
 
+@cache_por_usuario(valor_erro=[])
 def obter_pets():
     """
     Obtém a lista de pets do usuário atual com todas as informações detalhadas.
@@ -540,7 +841,7 @@ def obter_pets():
     if not hasattr(st.user, 'email'):
         return []
         
-    db = firestore.client()
+    db = obter_db()
     pets_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets")
     
     try:
@@ -573,7 +874,7 @@ def obter_pets():
         return pets
     except Exception as e:
         print(f"Erro ao obter pets: {e}")
-        return []
+        raise
 
 def editar_pet(pet_id, nome, especie, idade, raca, sexo, castrado, peso, altura, historia, saude, alimentacao, url_foto):
     """
@@ -600,7 +901,7 @@ def editar_pet(pet_id, nome, especie, idade, raca, sexo, castrado, peso, altura,
     if not hasattr(st.user, 'email'):
         return False
         
-    db = firestore.client()
+    db = obter_db()
     pet_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id)
     
     try:
@@ -627,21 +928,25 @@ def editar_pet(pet_id, nome, especie, idade, raca, sexo, castrado, peso, altura,
         
         # Atualizando pet no Firestore
         pet_ref.update(dados_pet)
+        invalidar_cache(st.user.email, "obter_pets")
         return True
     except Exception as e:
         print(f"Erro ao editar pet {pet_id}: {e}")
         return False
 
-def atualizar_resumo_pets(pets):
+def atualizar_resumo_pets(pets=None):
     """
-    Cria um resumo de informações para ser utilizada pelo Chatbot
+    Cria um resumo de informações para ser utilizada pelo Chatbot e monta de novo o system prompt
 
     Args:
         pets - lista de dicionários com informações de pets de usuário
+               (se None, usa a lista atual do Firestore; chame depois de salvar/editar/excluir)
     """
+    if not hasattr(st.user, 'email'):
+        return None
     
-    if not pets:
-        texto_final = "O usuário ainda não tem pets cadastrados."
+    if pets is None:
+        pets = obter_pets()
 
     resumos = []
     for info in pets:
@@ -658,14 +963,18 @@ def atualizar_resumo_pets(pets):
 - Histórico de alimentação:{info.get("alimentacao")}"""
         resumos.append(texto)
     
-    texto_final = "\n---\n".join(resumos)
+    if resumos:
+        texto_final = "\n---\n".join(resumos)
+    else:
+        texto_final = "O usuário ainda não tem pets cadastrados."
 
     # Conectando à base de dados e guardando a informação
-    db = firestore.client()
-    pets_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
+    db = obter_db()
+    usuario_ref = db.collection(COLECAO_USUARIOS).document(st.user.email)
 
     try:
-      pets_ref.update({"resumos_pet": texto_final})
+        _atualizar_usuario_e_system_prompt(usuario_ref, {"resumos_pet": texto_final})
+        invalidar_cache(st.user.email, "obter_perfil_usuario")
 
     except Exception as e:
         print(f"Erro ao salvar o resumo no perfil: {e}")
@@ -684,11 +993,14 @@ def excluir_pet(pet_id):
     if not hasattr(st.user, 'email'):
         return False
         
-    db = firestore.client()
+    db = obter_db()
     pet_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id)
     
     try:
         pet_ref.delete()
+        invalidar_cache(st.user.email, "obter_pets")
+        invalidar_cache(st.user.email, "obter_exames_pet", pet_id)
+        invalidar_cache(st.user.email, "obter_exames_pets")
         return True
     except Exception as e:
         print(f"Erro ao excluir pet {pet_id}: {e}")
@@ -698,15 +1010,166 @@ def excluir_pet(pet_id):
 # FUNÇÃO PARA GERAR RELATÓRIO PDF DO PET
 # ============================================================================
 
-def gerar_relatorio_pet_pdf(pet_data):
+@st.cache_resource(show_spinner=False)
+def obter_sessao_http():
     """
-    Gera um relatório PDF completo do pet para veterinário, incluindo exames.
+    Retorna uma sessão HTTP compartilhada, com pool de conexões reaproveitadas entre downloads.
+    """
+    sessao = requests.Session()
+    adaptador = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_DOWNLOADS_PARALELOS)
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    return sessao
+
+@st.cache_resource(show_spinner=False)
+def _obter_estilos_relatorio():
+    """
+    Monta uma única vez por processo os estilos usados nos relatórios.
+    
+    Returns:
+        dict: Estilos da folha padrão do reportlab mais os estilos personalizados do relatório
+    """
+    styles = getSampleStyleSheet()
+    return {
+        "Normal": styles['Normal'],
+        "titulo": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            textColor=colors.HexColor('#2E7D32'),
+            alignment=1  # Centralizado
+        ),
+        "subtitulo": ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+            textColor=colors.HexColor('#1976D2')
+        ),
+        "rodape": ParagraphStyle(
+            'Rodape',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=1  # Centralizado
+        ),
+        "separador_titulo": ParagraphStyle(
+            'SeparadorTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1,  # Centralizado
+            textColor=colors.HexColor('#1976D2')
+        ),
+    }
+
+def _gerar_paginas_separadoras(exames_numerados):
+    """
+    Gera, em um único documento, as páginas de identificação que antecedem cada exame anexado.
+    
+    Args:
+        exames_numerados: Lista de tuplas (número do exame, dicionário do exame)
+        
+    Returns:
+        PdfReader: Documento com uma página por exame, na mesma ordem da lista
+    """
+    styles = _obter_estilos_relatorio()
+    separador_story = []
+    
+    for posicao, (idx, exame) in enumerate(exames_numerados):
+        if posicao > 0:
+            separador_story.append(PageBreak())
+        
+        separador_story.append(Spacer(1, 2*inch))
+        separador_story.append(Paragraph(f"📋 EXAME {idx}: {exame['nome_exame']}", styles['separador_titulo']))
+        
+        # Data do exame
+        if exame["data_upload"]:
+            try:
+                if hasattr(exame["data_upload"], "date"):
+                    data_formatada = exame["data_upload"].date().strftime("%d/%m/%Y")
+                else:
+                    data_formatada = str(exame["data_upload"])[:10]
+                separador_story.append(Paragraph(f"Data de Upload: {data_formatada}", styles['Normal']))
+            except:
+                pass
+        
+        separador_story.append(Spacer(1, 1*inch))
+        separador_story.append(Paragraph("Arquivo original anexado abaixo:", styles['Normal']))
+    
+    separador_buffer = io.BytesIO()
+    SimpleDocTemplate(separador_buffer, pagesize=A4).build(separador_story)
+    separador_buffer.seek(0)
+    return PdfReader(separador_buffer)
+
+def _baixar_arquivo(url):
+    resposta = obter_sessao_http().get(url, timeout=TIMEOUT_DOWNLOAD)
+    resposta.raise_for_status()
+    return resposta.content
+
+def obter_arquivos_locais(urls):
+    """
+    Garante cópias locais de vários arquivos do Storage, mantendo a ordem da lista de entrada.
+    
+    Arquivos já presentes no cache em disco não são baixados de novo; os demais
+    são baixados em paralelo.
+    
+    Args:
+        urls: Lista de URLs (entradas vazias são ignoradas)
+        
+    Returns:
+        list: Caminho local de cada URL, na mesma ordem; None para URLs vazias ou downloads que falharam
+    """
+    if not any(urls):
+        return [None] * len(urls)
+    
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOADS_PARALELOS) as executor:
+        futuros = [executor.submit(obter_arquivo, url, _baixar_arquivo) if url else None for url in urls]
+        
+        caminhos = []
+        for url, futuro in zip(urls, futuros):
+            try:
+                caminhos.append(futuro.result() if futuro else None)
+            except Exception as e:
+                # Uma falha (ou timeout) não impede os demais downloads
+                print(f"Erro ao baixar arquivo {url}: {e}")
+                caminhos.append(None)
+        return caminhos
+
+def chave_relatorio_pet(pet_data, exames):
+    """
+    Calcula a chave de conteúdo do relatório de um pet.
+    
+    A chave muda sempre que os dados do pet ou o conjunto de exames mudam,
+    permitindo reaproveitar um relatório já gerado enquanto nada foi alterado.
     
     Args:
         pet_data: Dicionário com dados do pet
+        exames: Lista de exames do pet (como retornada por obter_exames_pet)
         
     Returns:
-        bytes: Conteúdo do PDF em bytes
+        str: Hash SHA-256 em hexadecimal
+    """
+    conteudo = {
+        "pet": pet_data,
+        "exames": [(exame.get("id"), exame.get("url_pdf")) for exame in exames],
+    }
+    serializado = json.dumps(conteudo, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+def _montar_capa_relatorio(pet_data, exames, numeros_exames, foto_caminho):
+    """
+    Monta as páginas iniciais do relatório (dados do pet e tabela de exames).
+    
+    Args:
+        pet_data: Dicionário com dados do pet
+        exames: Lista de exames do pet (do mais recente para o mais antigo)
+        numeros_exames: Mapa {id do exame: número exibido na tabela e na página de separação}
+        foto_caminho: Caminho local da foto do pet ou None
+        
+    Returns:
+        BytesIO: PDF das páginas iniciais
     """
     # Buffer em memória para o PDF
     buffer = io.BytesIO()
@@ -714,24 +1177,10 @@ def gerar_relatorio_pet_pdf(pet_data):
     # Cria o documento PDF
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
     
-    # Estilos
-    styles = getSampleStyleSheet()
-    titulo_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        textColor=colors.HexColor('#2E7D32'),
-        alignment=1  # Centralizado
-    )
-    
-    subtitulo_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.HexColor('#1976D2')
-    )
+    # Estilos (montados uma vez por processo)
+    styles = _obter_estilos_relatorio()
+    titulo_style = styles['titulo']
+    subtitulo_style = styles['subtitulo']
     
     # Conteúdo do PDF
     story = []
@@ -748,12 +1197,12 @@ def gerar_relatorio_pet_pdf(pet_data):
     # Foto do pet (se disponível)
     if pet_data.get('url_foto'):
         try:
-            # Baixa a imagem do Firebase Storage
-            response = requests.get(pet_data['url_foto'], timeout=30)
-            response.raise_for_status()
+            # Imagem já baixada do Firebase Storage
+            if foto_caminho is None:
+                raise ValueError("não foi possível baixar a foto")
             
             # Cria um objeto de imagem PIL para redimensionar
-            img_pil = Image.open(io.BytesIO(response.content))
+            img_pil = Image.open(foto_caminho)
             
             # Redimensiona a imagem mantendo proporção (máx 150x150px)
             img_pil.thumbnail((150, 150), Image.Resampling.LANCZOS)
@@ -907,14 +1356,13 @@ def gerar_relatorio_pet_pdf(pet_data):
         story.append(Spacer(1, 15))
     
     # Seção de Exames
-    exames = obter_exames_pet(pet_data.get('id'))
     if exames:
         story.append(Paragraph(f"📋 EXAMES ({len(exames)})", subtitulo_style))
         
         # Cria tabela de exames
         dados_exames = [['#', 'Nome do Exame', 'Tipo', 'Data de Upload', 'Link PDF']]
         
-        for idx, exame in enumerate(exames, 1):
+        for exame in exames:
             # Data formatada
             if exame["data_upload"]:
                 try:
@@ -952,7 +1400,7 @@ def gerar_relatorio_pet_pdf(pet_data):
                 url_exame = url_exame[:40] + "..."
             
             dados_exames.append([
-                str(idx),
+                str(numeros_exames[exame['id']]),
                 exame['nome_exame'],
                 tipo_exame,
                 data_formatada,
@@ -975,8 +1423,8 @@ def gerar_relatorio_pet_pdf(pet_data):
         
         # Nota sobre os exames
         nota_exames = """
-        NOTA: Os arquivos PDF dos exames estão anexados no final deste relatório. Cada exame é precedido 
-        por uma página de identificação com o nome e data do exame. Os links fornecidos na tabela acima 
+        NOTA: Os arquivos PDF dos exames estão anexados no final deste relatório, em ordem cronológica. Cada exame 
+        é precedido por uma página de identificação com o número (#), o nome e a data do exame. Os links fornecidos na tabela acima 
         também podem ser utilizados para acesso direto aos arquivos originais.
         """
         story.append(Paragraph(nota_exames, styles['Normal']))
@@ -996,114 +1444,204 @@ def gerar_relatorio_pet_pdf(pet_data):
     
     # Rodapé
     story.append(Spacer(1, 30))
-    rodape_style = ParagraphStyle(
-        'Rodape',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=1  # Centralizado
-    )
-    story.append(Paragraph("Dr. Tobias - Assistente Veterinário Digital", rodape_style))
+    story.append(Paragraph("Dr. Tobias - Assistente Veterinário Digital", styles['rodape']))
     
     # Gera o PDF do relatório principal
     doc.build(story)
     
-    # Obtém os exames para fazer merge com os PDFs
-    exames = obter_exames_pet(pet_data.get('id'))
+    buffer.seek(0)
+    return buffer
+
+def _chave_dados_pet(pet_data):
+    """Hash dos dados do pet que aparecem no relatório."""
+    return hashlib.sha256(json.dumps(pet_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _ler_manifesto_relatorio(pet_id):
+    """
+    Lê o manifesto do último relatório gerado para o pet.
+    
+    Returns:
+        dict: Manifesto ou None se não houver relatório anterior no cache
+    """
+    caminho = buscar_arquivo_gerado(f"manifesto_relatorio:{pet_id}")
+    if not caminho:
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except Exception as e:
+        print(f"Erro ao ler manifesto do relatório do pet {pet_id}: {e}")
+        return None
+
+def _gravar_manifesto_relatorio(pet_id, manifesto):
+    gravar_arquivo_gerado(
+        f"manifesto_relatorio:{pet_id}",
+        lambda arquivo: arquivo.write(json.dumps(manifesto).encode("utf-8"))
+    )
+
+def _abrir_relatorio_anterior(manifesto, pet_data, exames_cronologicos):
+    """
+    Abre o relatório anterior do pet se ele puder ser estendido com os exames novos.
+    
+    Isso só vale se os dados do pet não mudaram e se os exames do relatório anterior
+    continuam sendo os mais antigos, na mesma ordem (nenhum foi removido).
+    
+    Returns:
+        tuple: (arquivo mapeado, PdfReader) do relatório anterior, ou None para reconstruir do zero
+    """
+    if not manifesto or manifesto.get("chave_pet") != _chave_dados_pet(pet_data):
+        return None
+    
+    ids_anteriores = manifesto.get("exames", [])
+    ids_atuais = [exame['id'] for exame in exames_cronologicos]
+    if ids_atuais[:len(ids_anteriores)] != ids_anteriores:
+        return None
     
-    if not exames:
-        # Se não há exames, retorna apenas o relatório principal
-        buffer.seek(0)
-        return buffer.getvalue()
+    caminho = buscar_arquivo_gerado(manifesto.get("chave_arquivo", ""))
+    if not caminho:
+        return None
     
+    arquivo = None
     try:
-        # Cria um PdfWriter para o documento final
-        pdf_writer = PdfWriter()
-        
-        # Adiciona o relatório principal
-        buffer.seek(0)
-        relatorio_reader = PdfReader(buffer)
-        for page in relatorio_reader.pages:
-            pdf_writer.add_page(page)
-        
-        # Para cada exame, baixa o PDF e anexa
-        exames_anexados = 0
-        for idx, exame in enumerate(exames, 1):
-            if not exame.get('url_pdf'):
-                continue
-                
+        arquivo = ler_arquivo(caminho)
+        reader = PdfReader(arquivo)
+        if len(reader.pages) < manifesto["num_paginas_capa"]:
+            raise ValueError("relatório anterior menor que o esperado")
+        return arquivo, reader
+    except Exception as e:
+        print(f"Relatório anterior do pet {pet_data.get('id')} não pôde ser reaproveitado: {e}")
+        if arquivo is not None:
+            arquivo.close()
+        return None
+
+def gerar_relatorio_pet_pdf(pet_data, exames=None):
+    """
+    Gera um relatório PDF completo do pet para veterinário, incluindo exames.
+    
+    O PDF é gravado direto no cache de arquivos em disco: cada exame é lido por
+    mapeamento em memória e liberado logo após suas páginas serem anexadas.
+    Relatórios completos ficam guardados pela chave de conteúdo e são
+    reaproveitados enquanto pet e exames não mudarem.
+    
+    Os exames são anexados em ordem cronológica. Se desde o último relatório
+    apenas foram adicionados exames, as páginas dos exames antigos são copiadas
+    do relatório anterior e só a capa e os exames novos são gerados.
+    
+    Args:
+        pet_data: Dicionário com dados do pet
+        exames: Lista de exames já carregada (opcional; se None, busca no Firestore)
+        
+    Returns:
+        str: Caminho do PDF gerado no disco (abra com open(caminho, "rb"))
+    """
+    if exames is None:
+        exames = obter_exames_pet(pet_data.get('id'))
+    
+    chave = chave_relatorio_pet(pet_data, exames)
+    caminho_existente = buscar_arquivo_gerado(f"relatorio:{chave}")
+    if caminho_existente:
+        return caminho_existente
+    
+    # Os exames vêm do mais recente para o mais antigo; a numeração segue a ordem
+    # cronológica para que um exame novo nunca mude o número dos anteriores
+    exames_cronologicos = list(reversed(exames))
+    numeros_exames = {exame['id']: numero for numero, exame in enumerate(exames_cronologicos, 1)}
+    
+    manifesto = _ler_manifesto_relatorio(pet_data.get('id'))
+    relatorio_anterior = _abrir_relatorio_anterior(manifesto, pet_data, exames_cronologicos)
+    # O relatório anterior fica mapeado até o novo ser gravado e é fechado mesmo que
+    # algo falhe antes (download, capa ou merge)
+    try:
+        ids_reaproveitados = manifesto["exames"] if relatorio_anterior else []
+        exames_novos = exames_cronologicos[len(ids_reaproveitados):]
+        
+        # Obtém a foto e os PDFs dos exames novos de uma vez (cache em disco ou download em paralelo)
+        foto_caminho, *exames_caminhos = obter_arquivos_locais(
+            [pet_data.get('url_foto')] + [exame.get('url_pdf') for exame in exames_novos]
+        )
+        
+        # Os arquivos locais não podem sair do cache enquanto o relatório é montado
+        with arquivos_em_uso([foto_caminho] + exames_caminhos):
+            buffer = _montar_capa_relatorio(pet_data, exames, numeros_exames, foto_caminho)
+            
+            ids_anexados = list(ids_reaproveitados)
+            
             try:
-                # Baixa o PDF do exame
-                response = requests.get(exame['url_pdf'], timeout=30)
-                response.raise_for_status()
-                
-                # Lê o PDF baixado
-                exame_buffer = io.BytesIO(response.content)
-                exame_reader = PdfReader(exame_buffer)
-                
-                # Adiciona uma página de separação/título para o exame
-                separador_buffer = io.BytesIO()
-                separador_doc = SimpleDocTemplate(separador_buffer, pagesize=A4)
-                separador_styles = getSampleStyleSheet()
-                
-                separador_title_style = ParagraphStyle(
-                    'SeparadorTitle',
-                    parent=separador_styles['Heading1'],
-                    fontSize=16,
-                    spaceAfter=30,
-                    alignment=1,  # Centralizado
-                    textColor=colors.HexColor('#1976D2')
-                )
-                
-                separador_story = []
-                separador_story.append(Spacer(1, 2*inch))
-                separador_story.append(Paragraph(f"📋 EXAME {idx}: {exame['nome_exame']}", separador_title_style))
-                
-                # Data do exame
-                if exame["data_upload"]:
-                    try:
-                        if hasattr(exame["data_upload"], "date"):
-                            data_formatada = exame["data_upload"].date().strftime("%d/%m/%Y")
-                        else:
-                            data_formatada = str(exame["data_upload"])[:10]
-                        separador_story.append(Paragraph(f"Data de Upload: {data_formatada}", separador_styles['Normal']))
-                    except:
-                        pass
+                # Cria um PdfWriter para o documento final
+                pdf_writer = PdfWriter()
                 
-                separador_story.append(Spacer(1, 1*inch))
-                separador_story.append(Paragraph("Arquivo original anexado abaixo:", separador_styles['Normal']))
+                # Adiciona o relatório principal
+                relatorio_reader = PdfReader(buffer)
+                num_paginas_capa = len(relatorio_reader.pages)
+                for page in relatorio_reader.pages:
+                    pdf_writer.add_page(page)
                 
-                separador_doc.build(separador_story)
+                # Copia os exames já anexados no relatório anterior (tudo depois da capa antiga)
+                if relatorio_anterior:
+                    _, reader_anterior = relatorio_anterior
+                    for page in reader_anterior.pages[manifesto["num_paginas_capa"]:]:
+                        pdf_writer.add_page(page)
                 
-                # Adiciona a página de separação
-                separador_buffer.seek(0)
-                separador_reader = PdfReader(separador_buffer)
-                for page in separador_reader.pages:
-                    pdf_writer.add_page(page)
+                # Exames que falharam no download ficam de fora
+                exames_anexos = [
+                    (exame, exame_caminho)
+                    for exame, exame_caminho in zip(exames_novos, exames_caminhos)
+                    if exame_caminho is not None
+                ]
                 
-                # Adiciona as páginas do exame
-                for page in exame_reader.pages:
-                    pdf_writer.add_page(page)
+                if exames_anexos:
+                    # Todas as páginas de separação são geradas de uma vez
+                    separadores_reader = _gerar_paginas_separadoras(
+                        [(numeros_exames[exame['id']], exame) for exame, _ in exames_anexos]
+                    )
+                    
+                    for (exame, exame_caminho), separador in zip(exames_anexos, separadores_reader.pages):
+                        exame_arquivo = None
+                        try:
+                            exame_arquivo = ler_arquivo(exame_caminho)
+                            # Lê todas as páginas antes de anexar qualquer coisa: um exame
+                            # ilegível ou criptografado falha aqui e não deixa um separador órfão
+                            paginas_exame = list(PdfReader(exame_arquivo).pages)
+                            
+                            # Adiciona a página de separação e, em seguida, as páginas do exame
+                            pdf_writer.add_page(separador)
+                            for page in paginas_exame:
+                                pdf_writer.add_page(page)
+                            ids_anexados.append(exame['id'])
+                        except Exception as e:
+                            print(f"Erro ao anexar exame '{exame['nome_exame']}': {e}")
+                            # Continua com os outros exames mesmo se um falhar
+                        finally:
+                            # As páginas já foram copiadas para o writer; o arquivo pode ser liberado
+                            if exame_arquivo is not None:
+                                exame_arquivo.close()
                 
-                exames_anexados += 1
+                escrever_relatorio = pdf_writer.write
                 
             except Exception as e:
-                print(f"Erro ao anexar exame '{exame['nome_exame']}': {e}")
-                # Continua com os outros exames mesmo se um falhar
-                continue
-        
-        # Gera o PDF final com todos os exames anexados
-        final_buffer = io.BytesIO()
-        pdf_writer.write(final_buffer)
-        final_buffer.seek(0)
-        
-        return final_buffer.getvalue()
-        
-    except Exception as e:
-        print(f"Erro ao fazer merge dos PDFs: {e}")
-        # Em caso de erro no merge, retorna apenas o relatório principal
-        buffer.seek(0)
-        return buffer.getvalue()
+                print(f"Erro ao fazer merge dos PDFs: {e}")
+                # Em caso de erro no merge, usa apenas o relatório principal
+                ids_anexados = []
+                num_paginas_capa = None
+                escrever_relatorio = lambda arquivo: arquivo.write(buffer.getvalue())
+        
+        # Relatórios com exames faltando (download ou leitura falhou) não são reaproveitados
+        completo = len(ids_anexados) == len(exames)
+        chave_arquivo = f"relatorio:{chave}" if completo else f"relatorio:{chave}:{uuid.uuid4().hex}"
+        caminho = gravar_arquivo_gerado(chave_arquivo, escrever_relatorio)
+    finally:
+        if relatorio_anterior:
+            relatorio_anterior[0].close()
+    
+    if num_paginas_capa is not None:
+        _gravar_manifesto_relatorio(pet_data.get('id'), {
+            "chave_pet": _chave_dados_pet(pet_data),
+            "chave_arquivo": chave_arquivo,
+            "num_paginas_capa": num_paginas_capa,
+            "exames": ids_anexados,
+        })
+    
+    return caminho
 
 # ============================================================================
 # FUNÇÕES PARA GERENCIAMENTO DE EXAMES DOS PETS
@@ -1140,7 +1678,7 @@ def fazer_upload_exame_pet(arquivo_pdf, pet_id, nome_exame):
         
         # Upload para Firebase Storage
         print("Conectando ao Firebase Storage...")
-        bucket = storage.bucket()
+        bucket = obter_bucket()
         print(f"🔍 BUCKET OBTIDO: {bucket.name}")
         
         blob = bucket.blob(nome_arquivo)
@@ -1181,20 +1719,23 @@ def salvar_exame_pet(pet_id, nome_exame, url_pdf):
     if not hasattr(st.user, 'email'):
         return None
         
-    db = firestore.client()
-    exames_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id).collection("exames")
+    db = obter_db()
+    exame_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id).collection("exames").document()
     
     try:
         dados_exame = {
             "nome_exame": nome_exame,
             "url_pdf": url_pdf,
+            "status_processamento": "pendente",  # Atualizado pelo processamento em segundo plano
             "data_upload": datetime.now(),
             "data_atualizacao": datetime.now()
         }
         
         print(f"Salvando exame com dados: {dados_exame}")
-        doc_ref = exames_ref.add(dados_exame)
-        return doc_ref[1].id  # Retorna o ID do documento criado
+        exame_ref.set(dados_exame)
+        invalidar_cache(st.user.email, "obter_exames_pet", pet_id)
+        invalidar_cache(st.user.email, "obter_exames_pets")
+        return exame_ref.id  # Retorna o ID do documento criado
     except Exception as e:
         print(f"Erro ao salvar exame: {e}")
         return None
@@ -1214,7 +1755,7 @@ def listar_arquivos_pet_storage(pet_id, tipo_arquivo=""):
         return []
         
     try:
-        bucket = storage.bucket()
+        bucket = obter_bucket()
         
         # Define o prefixo baseado na nova estrutura hierárquica
         if tipo_arquivo:
@@ -1242,6 +1783,36 @@ def listar_arquivos_pet_storage(pet_id, tipo_arquivo=""):
         print(f"Erro ao listar arquivos do pet {pet_id}: {e}")
         return []
 
+def _consultar_exames_pet(db, email, pet_id):
+    """
+    Executa a consulta ordenada de exames de um pet (sem tratamento de erro).
+    
+    Args:
+        db: Cliente do Firestore
+        email: Email do usuário dono do pet
+        pet_id: ID do pet
+        
+    Returns:
+        list: Lista de dicionários com dados dos exames
+    """
+    exames_ref = db.collection(COLECAO_USUARIOS).document(email).collection("pets").document(pet_id).collection("exames")
+    docs = exames_ref.order_by("data_upload", direction=firestore.Query.DESCENDING).get()
+    
+    exames = []
+    for doc in docs:
+        exame_data = doc.to_dict()
+        exames.append({
+            "id": doc.id,
+            "nome_exame": exame_data.get("nome_exame", "Exame sem nome"),
+            "url_pdf": exame_data.get("url_pdf", ""),
+            # Exames anteriores ao processamento em segundo plano não têm status
+            "status_processamento": exame_data.get("status_processamento", "concluido"),
+            "data_upload": exame_data.get("data_upload"),
+            "data_atualizacao": exame_data.get("data_atualizacao")
+        })
+    return exames
+
+@cache_por_usuario(valor_erro=[])
 def obter_exames_pet(pet_id):
     """
     Obtém a lista de exames de um pet específico.
@@ -1255,26 +1826,39 @@ def obter_exames_pet(pet_id):
     if not hasattr(st.user, 'email'):
         return []
         
-    db = firestore.client()
-    exames_ref = db.collection(COLECAO_USUARIOS).document(st.user.email).collection("pets").document(pet_id).collection("exames")
+    db = obter_db()
     
     try:
-        docs = exames_ref.order_by("data_upload", direction=firestore.Query.DESCENDING).get()
-        exames = []
-        
-        for doc in docs:
-            exame_data = doc.to_dict()
-            exame_dict = {
-                "id": doc.id,
-                "nome_exame": exame_data.get("nome_exame", "Exame sem nome"),
-                "url_pdf": exame_data.get("url_pdf", ""),
-                "data_upload": exame_data.get("data_upload"),
-                "data_atualizacao": exame_data.get("data_atualizacao")
-            }
-            exames.append(exame_dict)
-            
-        return exames
+        return _consultar_exames_pet(db, st.user.email, pet_id)
     except Exception as e:
         print(f"Erro ao obter exames do pet {pet_id}: {e}")
-        return []
+        raise
 
+@cache_por_usuario(valor_erro={})
+def obter_exames_pets(pet_ids):
+    """
+    Obtém os exames de vários pets de uma vez, com as consultas em paralelo.
+    
+    Args:
+        pet_ids: Lista de IDs dos pets
+        
+    Returns:
+        dict: Mapa {pet_id: [exames]}; vazio se alguma consulta falhou
+    """
+    if not hasattr(st.user, 'email') or not pet_ids:
+        return {}
+    
+    # st.user só existe na thread do script, por isso o email é capturado aqui
+    email = st.user.email
+    db = obter_db()
+    
+    def consultar(pet_id):
+        try:
+            return _consultar_exames_pet(db, email, pet_id)
+        except Exception as e:
+            print(f"Erro ao obter exames do pet {pet_id}: {e}")
+            raise
+    
+    with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_PARALELAS, len(pet_ids))) as executor:
+        resultados = executor.map(consultar, pet_ids)
+        return dict(zip(pet_ids, resultados))
@@ -0,0 +1,267 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from paginas.funcoes import salvar_resposta_parcial, salvar_resposta_chat
+from paginas.llms import obter_cliente_openai, gerar_e_salvar_titulo_chat
+from paginas.contexto import registrar_uso_tokens, precisa_resumir, resumir_conversa
+from paginas.tarefas import agendar_tarefa
+from paginas.cache_respostas import guardar_resposta
+
+# Intervalo (em segundos) entre os checkpoints da resposta no Firestore
+INTERVALO_CHECKPOINT = 3.0
+
+# Tempo (em segundos) que uma geração concluída fica guardada esperando a sessão buscar o resultado
+TEMPO_RETENCAO = 3600
+
+# Respostas geradas ao mesmo tempo; as demais esperam na fila. Pool separado do de
+# paginas/tarefas.py, pois cada resposta ocupa uma thread durante todo o streaming
+MAX_GERACOES_SIMULTANEAS = 8
+
+# Gerações em andamento ou concluídas e ainda não buscadas: {id: estado}
+# Ficam no processo, fora da execução do script, então sobrevivem a reruns e à troca de página
+_geracoes = {}
+# Geração mais recente de cada conversa: {(email, chat_id): id}. Permite que uma sessão
+# nova (página recarregada, reconexão) volte a acompanhar uma resposta em andamento
+_geracoes_por_chat = {}
+_trava = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def _obter_executor_geracoes():
+    """Retorna o pool de threads das gerações de resposta, compartilhado pelo processo."""
+    return ThreadPoolExecutor(max_workers=MAX_GERACOES_SIMULTANEAS, thread_name_prefix="geracao-chat")
+
+def iniciar_geracao(email, chat_id, ordem, requisicao, mensagens, gerar_titulo=False, resumo_chat=None, cache_resposta=None, dados_sessao=None):
+    """
+    Coloca a resposta do assistente no pool de gerações e retorna imediatamente.
+
+    A thread lê o stream da OpenAI e acumula o texto em um buffer do processo, grava
+    checkpoints no Firestore, grava a resposta final e agenda as tarefas pós-resposta
+    (título e resumo), mesmo que o usuário clique em algo ou saia da página.
+
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat onde a resposta será gravada (None se a pergunta não foi salva)
+        ordem: Posição da resposta na conversa
+        requisicao: Argumentos de client.chat.completions.create (montar_requisicao_chat)
+        mensagens: Cópia do histórico, terminando na pergunta
+        gerar_titulo: Se o chat acabou de ser criado e precisa de título
+        resumo_chat: Resumo atual {"resumo", "resumo_ate"} ou None para não resumir nesta resposta
+        cache_resposta: {"consulta", "termos_privados"} para guardar a resposta no cache de respostas (opcional)
+        dados_sessao: Dados que a sessão guarda junto com a geração, devolvidos por retomar_geracao_do_chat
+
+    Returns:
+        str: ID da geração, usado para acompanhar e finalizar
+    """
+    _remover_antigas()
+
+    geracao_id = uuid.uuid4().hex
+    estado = {
+        "texto": "",
+        "versao": 0,
+        "concluida": False,
+        "concluida_em": None,
+        "erro": None,
+        "uso": {},
+        "persistida": False,
+        "tarefas": {},
+        "abandonada": False,
+        "chave_chat": (email, chat_id) if chat_id else None,
+        "ordem": ordem,
+        "dados_sessao": dados_sessao or {},
+        "condicao": threading.Condition(),
+    }
+    with _trava:
+        _geracoes[geracao_id] = estado
+        if estado["chave_chat"]:
+            _geracoes_por_chat[estado["chave_chat"]] = geracao_id
+
+    _obter_executor_geracoes().submit(
+        _executar_geracao,
+        geracao_id, estado, email, chat_id, ordem, requisicao, mensagens, gerar_titulo, resumo_chat, cache_resposta
+    )
+    return geracao_id
+
+def acompanhar_geracao(geracao_id, versao_vista, timeout=0.1):
+    """
+    Espera a resposta avançar além da versão já exibida (ou terminar) e retorna o estado atual.
+
+    Args:
+        geracao_id: ID retornado por iniciar_geracao
+        versao_vista: Última versão exibida (-1 para receber o estado atual na hora)
+        timeout: Espera máxima em segundos
+
+    Returns:
+        dict: texto, versao, concluida, erro, uso, persistida e tarefas; None se a geração não existe mais
+    """
+    with _trava:
+        estado = _geracoes.get(geracao_id)
+    if estado is None:
+        return None
+
+    condicao = estado["condicao"]
+    with condicao:
+        condicao.wait_for(lambda: estado["versao"] != versao_vista or estado["concluida"], timeout)
+        return _copiar_estado(estado)
+
+def finalizar_geracao(geracao_id):
+    """
+    Remove uma geração concluída do processo e retorna seu estado final.
+
+    Returns:
+        dict: Estado final ou None se já foi finalizada (ou ainda não terminou)
+    """
+    with _trava:
+        estado = _geracoes.get(geracao_id)
+        if estado is None or not estado["concluida"]:
+            return None
+        _descartar(geracao_id)
+    with estado["condicao"]:
+        return _copiar_estado(estado)
+
+def abandonar_geracao(geracao_id):
+    """
+    Desliga a sessão de uma geração que ela não vai mais exibir (ex: o usuário trocou de conversa).
+
+    A resposta continua sendo gerada e gravada; o estado é descartado assim que ela terminar.
+    """
+    with _trava:
+        estado = _geracoes.get(geracao_id)
+        if estado is None:
+            return
+        with estado["condicao"]:
+            if estado["concluida"]:
+                _descartar(geracao_id)
+            else:
+                estado["abandonada"] = True
+
+def retomar_geracao_do_chat(email, chat_id):
+    """
+    Volta a ligar uma sessão à geração de resposta de uma conversa, se ainda houver uma no processo.
+
+    Usada ao abrir a conversa: depois de recarregar a página, a sessão perde o ID da geração,
+    mas a resposta pode continuar sendo gerada (ou ter terminado sem ninguém buscá-la).
+
+    Returns:
+        dict: 'id', 'ordem' (posição da resposta na conversa) e 'dados_sessao'; None se não houver
+    """
+    with _trava:
+        geracao_id = _geracoes_por_chat.get((email, chat_id))
+        estado = _geracoes.get(geracao_id)
+        if estado is None:
+            return None
+        with estado["condicao"]:
+            # Abandonada por outra sessão (ou por esta, ao trocar de conversa): volta a ser acompanhada
+            estado["abandonada"] = False
+        return {"id": geracao_id, "ordem": estado["ordem"], "dados_sessao": estado["dados_sessao"]}
+
+def agendar_tarefas_pos_resposta(email, chat_id, mensagens, gerar_titulo=False, resumo_chat=None):
+    """
+    Agenda em segundo plano o título de um chat novo e o resumo das mensagens antigas, se necessário.
+
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        mensagens: Cópia do histórico completo, já com a resposta
+        gerar_titulo: Se o chat precisa de título
+        resumo_chat: Resumo atual {"resumo", "resumo_ate"} ou None para não resumir
+
+    Returns:
+        dict: Futures agendados, nas chaves "titulo" e/ou "resumo"
+    """
+    tarefas = {}
+    if gerar_titulo:
+        tarefas["titulo"] = agendar_tarefa(gerar_e_salvar_titulo_chat, email, chat_id, mensagens)
+    if resumo_chat is not None and precisa_resumir(len(mensagens), resumo_chat["resumo_ate"]):
+        tarefas["resumo"] = agendar_tarefa(
+            resumir_conversa, email, chat_id, mensagens, resumo_chat["resumo"], resumo_chat["resumo_ate"]
+        )
+    return tarefas
+
+def _copiar_estado(estado):
+    return {chave: valor for chave, valor in estado.items() if chave != "condicao"}
+
+def _descartar(geracao_id):
+    """Remove a geração do processo e do índice por conversa (chamar com a trava)."""
+    estado = _geracoes.pop(geracao_id, None)
+    if estado and _geracoes_por_chat.get(estado["chave_chat"]) == geracao_id:
+        del _geracoes_por_chat[estado["chave_chat"]]
+
+def _executar_geracao(geracao_id, estado, email, chat_id, ordem, requisicao, mensagens, gerar_titulo, resumo_chat, cache_resposta):
+    """Lê o stream da OpenAI para o buffer da geração e grava a resposta no Firestore."""
+    condicao = estado["condicao"]
+    texto = ""
+    conteudo_salvo = ""
+    inicio = time.monotonic()
+    ultimo_checkpoint = inicio
+
+    try:
+        client = obter_cliente_openai()
+        if client is None:
+            raise RuntimeError("Cliente OpenAI indisponível")
+
+        for chunk in client.chat.completions.create(**requisicao):
+            # O último pedaço do stream traz apenas o uso de tokens, sem choices
+            if chunk.usage is not None:
+                uso = registrar_uso_tokens(chunk.usage)
+                with condicao:
+                    estado["uso"] = uso
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                texto += chunk.choices[0].delta.content
+                with condicao:
+                    estado["texto"] = texto
+                    estado["versao"] += 1
+                    condicao.notify_all()
+
+                # Salva o que já foi gerado a cada INTERVALO_CHECKPOINT segundos
+                if chat_id and time.monotonic() - ultimo_checkpoint >= INTERVALO_CHECKPOINT:
+                    if salvar_resposta_parcial(email, chat_id, ordem, texto):
+                        conteudo_salvo = texto
+                    ultimo_checkpoint = time.monotonic()
+
+        # Perguntas genéricas: a próxima igual ou parecida é respondida sem chamar o modelo
+        if cache_resposta:
+            guardar_resposta(
+                cache_resposta["consulta"], texto, time.monotonic() - inicio, cache_resposta["termos_privados"]
+            )
+
+        persistida = bool(chat_id) and salvar_resposta_chat(email, chat_id, ordem, texto)
+        tarefas = {}
+        if persistida:
+            mensagens_finais = mensagens + [{"role": "assistant", "content": texto}]
+            tarefas = agendar_tarefas_pos_resposta(email, chat_id, mensagens_finais, gerar_titulo, resumo_chat)
+        _concluir(geracao_id, estado, persistida=persistida, tarefas=tarefas)
+    except Exception as e:
+        print(f"Erro na geração da resposta do chat {chat_id}: {e}")
+        # Guarda o que já foi gerado como resposta parcial
+        persistida = bool(chat_id and texto) and (
+            conteudo_salvo == texto or salvar_resposta_parcial(email, chat_id, ordem, texto)
+        )
+        _concluir(geracao_id, estado, persistida=persistida, erro=str(e))
+
+def _concluir(geracao_id, estado, persistida, tarefas=None, erro=None):
+    condicao = estado["condicao"]
+    with _trava:
+        with condicao:
+            estado["persistida"] = persistida
+            estado["tarefas"] = tarefas or {}
+            estado["erro"] = erro
+            estado["concluida"] = True
+            estado["concluida_em"] = time.monotonic()
+            condicao.notify_all()
+            # Nenhuma sessão vai buscar o resultado
+            if estado["abandonada"]:
+                _descartar(geracao_id)
+
+def _remover_antigas():
+    """Descarta gerações concluídas que nenhuma sessão buscou (ex: navegador fechado)."""
+    limite = time.monotonic() - TEMPO_RETENCAO
+    with _trava:
+        antigas = [
+            geracao_id for geracao_id, estado in _geracoes.items()
+            if estado["concluida"] and estado["concluida_em"] < limite
+        ]
+        for geracao_id in antigas:
+            _descartar(geracao_id)
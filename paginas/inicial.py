@@ -1,15 +1,21 @@
+import os
 import streamlit as st
 from paginas.funcoes import (
     obter_pets, 
     excluir_pet, 
     registrar_acao_usuario,
     gerar_relatorio_pet_pdf,
+    chave_relatorio_pet,
     fazer_upload_exame_pet,
     salvar_exame_pet,
-    obter_exames_pet
+    obter_exames_pets
 )
 from paginas.agentes_funcoes import (
-    relator
+    agendar_processamento_exame,
+    retomar_exames_pendentes,
+    STATUS_PENDENTE,
+    STATUS_PROCESSANDO,
+    STATUS_ERRO
 )
 
 st.title("🏠 Dr. Tobias - Página Inicial")
@@ -54,18 +60,14 @@ def dialog_adicionar_exame(pet_id, pet_nome):
                             exame_id = salvar_exame_pet(pet_id, nome_exame, url_pdf)
                             
                             if exame_id:
-                                st.success(f"✅ Exame '{nome_exame}' adicionado com sucesso!")
                                 registrar_acao_usuario("Adicionar Exame", f"Usuário adicionou exame '{nome_exame}' para o pet {pet_nome}")
                                 
-                                # Encaminha as informações gerais do exame, tratadas pela IA, para o banco de dados
-                                relator(pet_id = pet_id, exame_doc_id = exame_id, pdf = arquivo_pdf)
-                                st.success(f"✅ Ótimo! Nosso assistente digital já estudou o exame de {pet_nome} e está pronto para conversar sobre os resultados.")
-
-                                st.balloons()
+                                # A análise do exame pela IA roda em segundo plano; o status aparece no card do pet
+                                agendar_processamento_exame(pet_id=pet_id, exame_doc_id=exame_id, pdf=arquivo_pdf)
                                 
-                                # Pausa antes de fechar o diálogo
-                                import time
-                                time.sleep(2)
+                                # Avisos em toast continuam visíveis depois que o diálogo fecha
+                                st.toast(f"✅ Exame '{nome_exame}' adicionado com sucesso!")
+                                st.toast(f"Nosso assistente digital já começou a estudar o exame de {pet_nome}. Acompanhe o andamento no card do pet. 🐾")
                                 st.rerun()
                             else:
                                 st.error("❌ Erro ao salvar exame no banco de dados.")
@@ -76,6 +78,223 @@ def dialog_adicionar_exame(pet_id, pet_nome):
             if st.form_submit_button("❌ Cancelar", use_container_width=True):
                 st.rerun()
 
+# ============================================================================
+# CARD DO PET
+# ============================================================================
+
+@st.fragment
+def card_pet(pet, ids_pets):
+    """
+    Exibe o card de um pet. Os botões do card (atualizar status, preparar relatório)
+    executam de novo só o card, sem recarregar a página inteira.
+    
+    Args:
+        pet: Dicionário com os dados do pet
+        ids_pets: IDs de todos os pets da página (chave do cache de exames)
+    """
+    # Container do pet com borda
+    with st.container(border=True):
+        # Foto do pet centralizada
+        if pet["url_foto"]:
+            st.image(pet["url_foto"], use_container_width=True)
+        else:
+            st.markdown("🐾", help="Sem foto")
+
+        # Nome do pet
+        st.markdown(f"### {pet['nome']}")
+
+        # Informações básicas essenciais
+        st.markdown(f"**{pet['especie']}** • **{pet['raca']}**")
+        st.markdown(f"**{pet['sexo']}** • **{pet['idade']} anos**")
+
+        # Mesmo resultado carregado para a página (vem do cache); numa atualização só
+        # deste card, busca de novo apenas se os exames mudaram desde então
+        exames = obter_exames_pets(ids_pets).get(pet['id'], [])
+
+        # Contador de exames (a lista já está carregada para o status, o expander e o relatório)
+        exames_count = len(exames)
+        if exames_count > 0:
+            st.markdown(f"📋 **{exames_count}** exame(s) cadastrado(s)")
+        else:
+            st.markdown("📋 Nenhum exame cadastrado")
+
+        # Exames ainda em análise pela IA
+        exames_em_analise = [
+            exame for exame in exames
+            if exame['status_processamento'] in (STATUS_PENDENTE, STATUS_PROCESSANDO)
+        ]
+        if exames_em_analise:
+            col_status, col_atualizar = st.columns([3, 1])
+            with col_status:
+                st.caption(f"⏳ {len(exames_em_analise)} exame(s) em análise pelo Dr. Tobias")
+            with col_atualizar:
+                if st.button("🔄", key=f"atualizar_exames_{pet['id']}", help="Atualizar status da análise"):
+                    st.rerun(scope="fragment")
+
+
+        # Informações detalhadas agrupadas em "Saber mais"
+        with st.expander("ℹ️ Saber mais", expanded=False):
+            # Informações de castração
+            if pet['castrado'] == "Sim":
+                castrado_icon = "✅"
+            elif pet['castrado'] == "Não":
+                castrado_icon = "❌"
+            elif pet['castrado'] == "Não sei":
+                castrado_icon = "❓"
+            else:
+                # Para pets antigos que podem ter valor boolean
+                castrado_icon = "✅" if pet['castrado'] else "❌"
+            st.markdown(f"**🔸 Castrado:** {castrado_icon} {pet['castrado']}")
+
+            # Data de cadastro
+            if pet["data_cadastro"]:
+                try:
+                    if hasattr(pet["data_cadastro"], "date"):
+                        data_formatada = pet["data_cadastro"].date().strftime("%d/%m/%Y")
+                    else:
+                        data_formatada = str(pet["data_cadastro"])[:10]
+                except:
+                    data_formatada = "Data não disponível"
+                st.markdown(f"**📅 Cadastrado em:** {data_formatada}")
+
+
+            if pet['historia']:
+                st.markdown("**📖 História do Pet:**")
+                st.write(pet['historia'])
+
+            if pet['saude']:
+                st.markdown("**🏥 Saúde Geral:**")
+                st.write(pet['saude'])
+
+            if pet['alimentacao']:
+                st.markdown("**🍽️ Alimentação:**")
+                st.write(pet['alimentacao'])
+
+            # Seção de exames
+            if exames:
+                st.markdown("---")
+                st.markdown(f"**📋 Exames ({len(exames)}):**")
+
+                for idx, exame in enumerate(exames, 1):
+                    # Data do exame formatada
+                    if exame["data_upload"]:
+                        try:
+                            if hasattr(exame["data_upload"], "date"):
+                                data_exame = exame["data_upload"].date().strftime("%d/%m/%Y")
+                                hora_exame = exame["data_upload"].strftime("%H:%M")
+                                data_completa = f"{data_exame} às {hora_exame}"
+                            else:
+                                data_completa = str(exame["data_upload"])[:19].replace("T", " às ")
+                        except:
+                            data_completa = "Data não disponível"
+                    else:
+                        data_completa = "Data não disponível"
+
+                    # Exibe informações detalhadas do exame
+                    st.markdown(f"**{idx}. {exame['nome_exame']}**")
+                    st.markdown(f"   📅 **Enviado em:** {data_completa}")
+
+                    # Determina o tipo de exame baseado no nome
+                    nome_lower = exame['nome_exame'].lower()
+                    if any(palavra in nome_lower for palavra in ['sangue', 'hemograma', 'bioquimic']):
+                        tipo_exame = "🩸 Exame de Sangue"
+                    elif any(palavra in nome_lower for palavra in ['raio', 'radiograf', 'rx']):
+                        tipo_exame = "📷 Raio-X"
+                    elif any(palavra in nome_lower for palavra in ['ultra', 'ecograf']):
+                        tipo_exame = "📡 Ultrassom/Ecografia"
+                    elif any(palavra in nome_lower for palavra in ['urina', 'urinalis']):
+                        tipo_exame = "🧪 Exame de Urina"
+                    elif any(palavra in nome_lower for palavra in ['fezes', 'parasit']):
+                        tipo_exame = "🔬 Exame de Fezes"
+                    elif any(palavra in nome_lower for palavra in ['cardiologico', 'coração', 'eco']):
+                        tipo_exame = "❤️ Exame Cardiológico"
+                    elif any(palavra in nome_lower for palavra in ['oftalmologic', 'olho', 'visão']):
+                        tipo_exame = "👁️ Exame Oftalmológico"
+                    else:
+                        tipo_exame = "📋 Exame Geral"
+
+                    st.markdown(f"   🏷️ **Tipo:** {tipo_exame}")
+
+                    if exame['status_processamento'] == STATUS_PENDENTE:
+                        st.markdown("   ⏳ **Análise:** aguardando na fila")
+                    elif exame['status_processamento'] == STATUS_PROCESSANDO:
+                        st.markdown("   🔄 **Análise:** em andamento")
+                    elif exame['status_processamento'] == STATUS_ERRO:
+                        st.markdown("   ⚠️ **Análise:** não foi possível analisar este exame")
+
+                    if exame['url_pdf']:
+                        st.markdown(f"   [📄 Baixar PDF do Exame]({exame['url_pdf']})")
+
+                    if idx < len(exames):  # Não adiciona divisor após o último exame
+                        st.markdown("")
+            else:
+                st.markdown("---")
+                st.markdown("**📋 Exames:** Nenhum exame cadastrado")
+
+        # Botões de ação divididos em 2 colunas
+        col_btn1, col_btn2 = st.columns(2)
+
+        with col_btn1:
+            # Botão de gerar relatório
+            num_exames = len(exames)
+
+            if num_exames > 0:
+                help_text = f"Baixar relatório completo + {num_exames} exame(s) anexado(s)"
+                label_texto = f"📄 Relatório + {num_exames} Exames"
+            else:
+                help_text = "Baixar relatório veterinário"
+                label_texto = "📄 Gerar Relatório"
+
+            # O PDF só é montado sob demanda e reaproveitado enquanto
+            # os dados do pet e o conjunto de exames não mudarem
+            chave_relatorio = chave_relatorio_pet(pet, exames)
+            relatorio = st.session_state.relatorios_pet.get(pet['id'])
+
+            # O arquivo pode ter saído do cache em disco; nesse caso, prepara de novo
+            if relatorio and relatorio["chave"] == chave_relatorio and os.path.exists(relatorio["caminho"]):
+                with open(relatorio["caminho"], "rb") as arquivo_relatorio:
+                    st.download_button(
+                        label=label_texto,
+                        data=arquivo_relatorio,
+                        file_name=f"relatorio_completo_{pet['nome']}.pdf",
+                        mime="application/pdf",
+                        help=help_text,
+                        key=f"baixar_relatorio_{pet['id']}",
+                        use_container_width=True,
+                        type="primary"
+                    )
+            elif st.button(
+                "📄 Preparar Relatório",
+                key=f"preparar_relatorio_{pet['id']}",
+                help=help_text,
+                use_container_width=True,
+                type="primary"
+            ):
+                with st.spinner(f"Montando o relatório de {pet['nome']}... 🐾"):
+                    caminho_relatorio = gerar_relatorio_pet_pdf(pet, exames)
+                st.session_state.relatorios_pet[pet['id']] = {
+                    "chave": chave_relatorio,
+                    "caminho": caminho_relatorio
+                }
+                registrar_acao_usuario("Gerar Relatório", f"Usuário gerou o relatório do pet {pet['nome']}")
+                st.rerun(scope="fragment")
+
+        with col_btn2:
+            # Botão de adicionar exame
+            if st.button(
+                "📋 Adicionar Exame",
+                key=f"add_exame_{pet['id']}",
+                help="Adicionar exame em PDF",
+                use_container_width=True,
+                type="secondary"
+            ):
+                dialog_adicionar_exame(pet['id'], pet['nome'])
+
+
+# Relatórios já montados na sessão: {pet_id: {"chave": ..., "caminho": ...}}
+if 'relatorios_pet' not in st.session_state:
+    st.session_state.relatorios_pet = {}
+
 # ============================================================================
 # WELCOME MESSAGE
 # ============================================================================
@@ -92,6 +311,13 @@ else:
 
 pets = obter_pets()
 
+# Carrega os exames de todos os pets de uma vez; cada card lê o mesmo resultado do cache
+ids_pets = [pet['id'] for pet in pets]
+exames_pets = obter_exames_pets(ids_pets)
+
+# Exames que ficaram sem análise (ex: servidor reiniciado no meio) voltam para a fila
+retomar_exames_pendentes(exames_pets)
+
 if len(pets) > 0: 
     st.subheader(f"🐾 Seus Pets ({len(pets)})")
     
@@ -102,158 +328,7 @@ if len(pets) > 0:
         # Para cada pet no grupo atual (máximo 3)
         for idx, pet in enumerate(pets[i:i+3]):
             with cols[idx]:
-                # Container do pet com borda
-                with st.container(border=True):
-                    # Foto do pet centralizada
-                    if pet["url_foto"]:
-                        st.image(pet["url_foto"], use_container_width=True)
-                    else:
-                        st.markdown("🐾", help="Sem foto")
-                    
-                    # Nome do pet
-                    st.markdown(f"### {pet['nome']}")
-                    
-                    # Informações básicas essenciais
-                    st.markdown(f"**{pet['especie']}** • **{pet['raca']}**")
-                    st.markdown(f"**{pet['sexo']}** • **{pet['idade']} anos**")
-                    
-                    # Contador de exames
-                    exames_count = len(obter_exames_pet(pet['id']))
-                    if exames_count > 0:
-                        st.markdown(f"📋 **{exames_count}** exame(s) cadastrado(s)")
-                    else:
-                        st.markdown("📋 Nenhum exame cadastrado")
-                    
-                    
-                    # Informações detalhadas agrupadas em "Saber mais"
-                    with st.expander("ℹ️ Saber mais", expanded=False):
-                        # Informações de castração
-                        if pet['castrado'] == "Sim":
-                            castrado_icon = "✅"
-                        elif pet['castrado'] == "Não":
-                            castrado_icon = "❌"
-                        elif pet['castrado'] == "Não sei":
-                            castrado_icon = "❓"
-                        else:
-                            # Para pets antigos que podem ter valor boolean
-                            castrado_icon = "✅" if pet['castrado'] else "❌"
-                        st.markdown(f"**🔸 Castrado:** {castrado_icon} {pet['castrado']}")
-                        
-                        # Data de cadastro
-                        if pet["data_cadastro"]:
-                            try:
-                                if hasattr(pet["data_cadastro"], "date"):
-                                    data_formatada = pet["data_cadastro"].date().strftime("%d/%m/%Y")
-                                else:
-                                    data_formatada = str(pet["data_cadastro"])[:10]
-                            except:
-                                data_formatada = "Data não disponível"
-                            st.markdown(f"**📅 Cadastrado em:** {data_formatada}")
-                        
-                        
-                        if pet['historia']:
-                            st.markdown("**📖 História do Pet:**")
-                            st.write(pet['historia'])
-                        
-                        if pet['saude']:
-                            st.markdown("**🏥 Saúde Geral:**")
-                            st.write(pet['saude'])
-                        
-                        if pet['alimentacao']:
-                            st.markdown("**🍽️ Alimentação:**")
-                            st.write(pet['alimentacao'])
-                        
-                        # Seção de exames
-                        exames = obter_exames_pet(pet['id'])
-                        if exames:
-                            st.markdown("---")
-                            st.markdown(f"**📋 Exames ({len(exames)}):**")
-                            
-                            for idx, exame in enumerate(exames, 1):
-                                # Data do exame formatada
-                                if exame["data_upload"]:
-                                    try:
-                                        if hasattr(exame["data_upload"], "date"):
-                                            data_exame = exame["data_upload"].date().strftime("%d/%m/%Y")
-                                            hora_exame = exame["data_upload"].strftime("%H:%M")
-                                            data_completa = f"{data_exame} às {hora_exame}"
-                                        else:
-                                            data_completa = str(exame["data_upload"])[:19].replace("T", " às ")
-                                    except:
-                                        data_completa = "Data não disponível"
-                                else:
-                                    data_completa = "Data não disponível"
-                                
-                                # Exibe informações detalhadas do exame
-                                st.markdown(f"**{idx}. {exame['nome_exame']}**")
-                                st.markdown(f"   📅 **Enviado em:** {data_completa}")
-                                
-                                # Determina o tipo de exame baseado no nome
-                                nome_lower = exame['nome_exame'].lower()
-                                if any(palavra in nome_lower for palavra in ['sangue', 'hemograma', 'bioquimic']):
-                                    tipo_exame = "🩸 Exame de Sangue"
-                                elif any(palavra in nome_lower for palavra in ['raio', 'radiograf', 'rx']):
-                                    tipo_exame = "📷 Raio-X"
-                                elif any(palavra in nome_lower for palavra in ['ultra', 'ecograf']):
-                                    tipo_exame = "📡 Ultrassom/Ecografia"
-                                elif any(palavra in nome_lower for palavra in ['urina', 'urinalis']):
-                                    tipo_exame = "🧪 Exame de Urina"
-                                elif any(palavra in nome_lower for palavra in ['fezes', 'parasit']):
-                                    tipo_exame = "🔬 Exame de Fezes"
-                                elif any(palavra in nome_lower for palavra in ['cardiologico', 'coração', 'eco']):
-                                    tipo_exame = "❤️ Exame Cardiológico"
-                                elif any(palavra in nome_lower for palavra in ['oftalmologic', 'olho', 'visão']):
-                                    tipo_exame = "👁️ Exame Oftalmológico"
-                                else:
-                                    tipo_exame = "📋 Exame Geral"
-                                
-                                st.markdown(f"   🏷️ **Tipo:** {tipo_exame}")
-                                
-                                if exame['url_pdf']:
-                                    st.markdown(f"   [📄 Baixar PDF do Exame]({exame['url_pdf']})")
-                                
-                                if idx < len(exames):  # Não adiciona divisor após o último exame
-                                    st.markdown("")
-                        else:
-                            st.markdown("---")
-                            st.markdown("**📋 Exames:** Nenhum exame cadastrado")
-                    
-                    # Botões de ação divididos em 2 colunas
-                    col_btn1, col_btn2 = st.columns(2)
-                    
-                    with col_btn1:
-                        # Botão de gerar relatório
-                        exames_pet = obter_exames_pet(pet['id'])
-                        num_exames = len(exames_pet)
-                        
-                        if num_exames > 0:
-                            help_text = f"Baixar relatório completo + {num_exames} exame(s) anexado(s)"
-                            label_texto = f"📄 Relatório + {num_exames} Exames"
-                        else:
-                            help_text = "Baixar relatório veterinário"
-                            label_texto = "📄 Gerar Relatório"
-                        
-                        # Botão de download direto
-                        st.download_button(
-                            label=label_texto,
-                            data=gerar_relatorio_pet_pdf(pet),
-                            file_name=f"relatorio_completo_{pet['nome']}.pdf",
-                            mime="application/pdf",
-                            help=help_text,
-                            use_container_width=True,
-                            type="primary"
-                        )
-                    
-                    with col_btn2:
-                        # Botão de adicionar exame
-                        if st.button(
-                            "📋 Adicionar Exame",
-                            key=f"add_exame_{pet['id']}",
-                            help="Adicionar exame em PDF",
-                            use_container_width=True,
-                            type="secondary"
-                        ):
-                            dialog_adicionar_exame(pet['id'], pet['nome'])
+                card_pet(pet, ids_pets)
         
         # Espaçamento entre linhas de pets
         st.markdown("---")
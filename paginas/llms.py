@@ -1,20 +1,53 @@
+import httpx
 import streamlit as st
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
+from paginas.funcoes import atualizar_titulo_chat
 
 # Modelo padrão para as funções auxiliares (pode ser ajustado ou passado como argumento)
 MODELO_PADRAO = 'gpt-4o-mini'
 
-# Helper para obter cliente OpenAI (evita repetição e centraliza erro de chave)
-def _get_openai_client():
-    """Retorna um cliente OpenAI inicializado ou None se a chave não for encontrada."""
+# Conexões HTTP com a OpenAI, compartilhadas por todo o processo
+MAX_CONEXOES_OPENAI = 20
+MAX_CONEXOES_OCIOSAS_OPENAI = 10
+TIMEOUT_OPENAI = httpx.Timeout(60.0, connect=5.0)  # Leitura longa por causa do streaming
+# O SDK repete sozinho (espera exponencial com variação aleatória) erros 408/409/429/5xx e falhas de conexão
+MAX_TENTATIVAS_OPENAI = 3
+
+
+@st.cache_resource(show_spinner=False)
+def _criar_cliente_openai(api_key):
+    """Cria o cliente OpenAI do processo, com pool de conexões keep-alive, timeouts e nova tentativa."""
+    return OpenAI(
+        api_key=api_key,
+        timeout=TIMEOUT_OPENAI,
+        max_retries=MAX_TENTATIVAS_OPENAI,
+        http_client=DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONEXOES_OPENAI,
+                max_keepalive_connections=MAX_CONEXOES_OCIOSAS_OPENAI,
+                keepalive_expiry=30.0
+            )
+        )
+    )
+
+def obter_cliente_openai():
+    """
+    Retorna o cliente OpenAI compartilhado pelo processo (chat, títulos, resumos e exames).
+
+    Pode ser chamada fora da thread do script (tarefas em segundo plano).
+
+    Returns:
+        OpenAI: Cliente inicializado ou None se a chave não for encontrada
+    """
     try:
         api_key = st.secrets["OPENAI_API_KEY"]
-        return OpenAI(api_key=api_key)
     except KeyError:
-        st.error("Erro de configuração: Chave secreta 'OPENAI_API_KEY' não encontrada.")
+        print("Erro de configuração: Chave secreta 'OPENAI_API_KEY' não encontrada.")
         return None
+    try:
+        return _criar_cliente_openai(api_key)
     except Exception as e:
-        st.error(f"Erro ao inicializar cliente OpenAI: {e}")
+        print(f"Erro ao inicializar cliente OpenAI: {e}")
         return None
 
 def gerar_titulo_chat(mensagens):
@@ -27,7 +60,7 @@ def gerar_titulo_chat(mensagens):
     Returns:
         str: Título gerado ou None se falhou
     """
-    client = _get_openai_client()
+    client = obter_cliente_openai()
     if not client:
         return None
         
@@ -56,4 +89,69 @@ Responda apenas com o título, sem explicações."""
         return titulo[:50]  # Garante máximo de 50 caracteres
     except Exception as e:
         print(f"Erro ao gerar título do chat: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+def gerar_e_salvar_titulo_chat(email, chat_id, mensagens):
+    """
+    Gera o título de um chat já salvo e o grava no lugar do título provisório.
+    
+    Feita para rodar em segundo plano (agendar_tarefa), fora do caminho da resposta.
+    
+    Args:
+        email: Email do dono do chat
+        chat_id: ID do chat
+        mensagens: Cópia das mensagens do chat
+        
+    Returns:
+        dict: chat_id e título gravado, ou None se falhou
+    """
+    titulo = gerar_titulo_chat(mensagens)
+    if not titulo or not atualizar_titulo_chat(email, chat_id, titulo):
+        return None
+    return {"chat_id": chat_id, "titulo": titulo}
+
+def gerar_resumo_conversa(resumo_anterior, mensagens):
+    """
+    Condensa mensagens antigas de um chat em um resumo, somando-as ao resumo anterior.
+    
+    Args:
+        resumo_anterior: Resumo já existente das mensagens anteriores (ou None)
+        mensagens: Mensagens a incorporar ao resumo
+        
+    Returns:
+        str: Novo resumo ou None se falhou
+    """
+    client = obter_cliente_openai()
+    if not client:
+        return None
+    
+    conteudo_chat = ""
+    for msg in mensagens:
+        if msg["role"] == "user":
+            conteudo_chat += f"Usuário: {msg['content']}\n"
+        elif msg["role"] == "assistant":
+            conteudo_chat += f"Assistente: {msg['content']}\n"
+    
+    prompt = f"""Você mantém o resumo de uma conversa entre um tutor de pets e Dr. Tobias, um assistente veterinário virtual.
+Atualize o resumo abaixo incorporando as novas mensagens. Preserve nomes dos pets, sintomas, datas, medicamentos,
+exames e orientações já dadas, além de dúvidas que ficaram em aberto. Escreva em português, em até 200 palavras.
+
+RESUMO ATUAL:
+{resumo_anterior or 'Nenhum (início da conversa).'}
+
+NOVAS MENSAGENS:
+{conteudo_chat}
+
+Responda apenas com o resumo atualizado."""
+
+    try:
+        completion = client.chat.completions.create(
+            model=MODELO_PADRAO,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=400,
+            temperature=0.3
+        )
+        return completion.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Erro ao gerar resumo da conversa: {e}")
+        return None
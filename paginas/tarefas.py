@@ -0,0 +1,50 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+# Número de threads para tarefas em segundo plano (chamadas de IA, processamento de arquivos...)
+MAX_WORKERS = 4
+
+
+@st.cache_resource(show_spinner=False)
+def obter_executor():
+    """
+    Retorna o pool de threads compartilhado pelo processo para tarefas em segundo plano.
+    """
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="dr-tobias")
+
+def agendar_tarefa(funcao, *args, **kwargs):
+    """
+    Executa uma função no pool de segundo plano sem esperar o resultado.
+
+    As tarefas rodam fora da thread do script: não podem usar st.user nem
+    elementos de interface, então tudo que precisam deve vir nos argumentos.
+
+    Returns:
+        Future: Permite consultar o andamento, se necessário
+    """
+    return obter_executor().submit(funcao, *args, **kwargs)
+
+def executar_com_tentativas(funcao, *args, tentativas=3, espera_inicial=2.0, repetir_se=None, **kwargs):
+    """
+    Executa uma função repetindo em caso de exceção, com espera exponencial e variação aleatória.
+
+    Args:
+        funcao: Função a executar
+        tentativas: Número máximo de tentativas
+        espera_inicial: Espera (em segundos) antes da segunda tentativa; dobra a cada falha
+        repetir_se: Função que recebe a exceção e diz se vale tentar de novo (padrão: qualquer exceção)
+
+    Returns:
+        O retorno da função; a exceção da última tentativa é propagada
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao(*args, **kwargs)
+        except Exception as e:
+            if tentativa == tentativas or (repetir_se is not None and not repetir_se(e)):
+                raise
+            espera = espera_inicial * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)
+            print(f"Tentativa {tentativa}/{tentativas} de {funcao.__name__} falhou ({e}). Nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
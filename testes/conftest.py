@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Permite importar o pacote 'paginas' rodando o pytest a partir da raiz do projeto
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_PROJETO not in sys.path:
+    sys.path.insert(0, RAIZ_PROJETO)
+
+
+@pytest.fixture
+def cache_arquivos_temporario(tmp_path, monkeypatch):
+    """Aponta o cache de arquivos em disco para um diretório temporário do teste."""
+    from paginas import cache_arquivos
+    monkeypatch.setattr(cache_arquivos, "DIRETORIO_CACHE", str(tmp_path / "cache"))
+    # O índice em memória é do processo: cada teste começa com um cache vazio
+    monkeypatch.setattr(cache_arquivos, "_indice", cache_arquivos.OrderedDict())
+    monkeypatch.setattr(cache_arquivos, "_indice_carregado", False)
+    monkeypatch.setattr(cache_arquivos, "_tamanho_total", 0)
+    return tmp_path / "cache"
@@ -0,0 +1,59 @@
+"""
+Remoção LRU do cache de arquivos: o excedente sai pelos arquivos usados há mais tempo,
+nunca pelo que acabou de ser gravado ou lido, nem pelos reservados com arquivos_em_uso.
+"""
+import os
+
+from paginas import cache_arquivos
+
+
+def _gravar(chave, tamanho):
+    return cache_arquivos.gravar_arquivo_gerado(chave, lambda arquivo: arquivo.write(b"x" * tamanho))
+
+
+def test_remove_os_menos_usados_e_preserva_os_recentes(cache_arquivos_temporario, monkeypatch):
+    monkeypatch.setattr(cache_arquivos, "TAMANHO_MAXIMO_CACHE", 250)
+    monkeypatch.setattr(cache_arquivos, "PROTECAO_USO_RECENTE", 0)
+
+    antigo = _gravar("antigo", 100)
+    reservado = _gravar("reservado", 100)
+    with cache_arquivos.arquivos_em_uso([reservado]):
+        novo = _gravar("novo", 100)
+
+        # O mais antigo sai; o reservado fica mesmo sendo anterior ao novo
+        assert not os.path.exists(antigo)
+        assert os.path.exists(reservado)
+        assert os.path.exists(novo)
+
+        # Ainda acima do limite, mas nada que possa sair: nem o reservado, nem o recém-gravado
+        ultimo = _gravar("ultimo", 100)
+        assert os.path.exists(reservado) and os.path.exists(ultimo)
+        assert not os.path.exists(novo)
+
+    assert cache_arquivos.buscar_arquivo_gerado("antigo") is None
+    assert cache_arquivos.obter_estatisticas_cache_arquivos()["bytes"] == 200
+
+
+def test_uso_recente_protege_o_caminho_devolvido(cache_arquivos_temporario, monkeypatch):
+    monkeypatch.setattr(cache_arquivos, "TAMANHO_MAXIMO_CACHE", 150)
+
+    primeiro = _gravar("primeiro", 100)
+    segundo = _gravar("segundo", 100)
+
+    # Os dois foram usados agora: o cache passa do limite por um tempo, mas nenhum some
+    assert os.path.exists(primeiro) and os.path.exists(segundo)
+
+
+def test_indice_carregado_do_disco(cache_arquivos_temporario, monkeypatch):
+    _gravar("existente", 100)
+    # Simula um processo novo: o índice em memória é refeito a partir do disco
+    monkeypatch.setattr(cache_arquivos, "_indice", cache_arquivos.OrderedDict())
+    monkeypatch.setattr(cache_arquivos, "_indice_carregado", False)
+    monkeypatch.setattr(cache_arquivos, "_tamanho_total", 0)
+    monkeypatch.setattr(cache_arquivos, "TAMANHO_MAXIMO_CACHE", 150)
+    monkeypatch.setattr(cache_arquivos, "PROTECAO_USO_RECENTE", 0)
+
+    _gravar("outro", 100)
+
+    assert cache_arquivos.buscar_arquivo_gerado("existente") is None
+    assert cache_arquivos.buscar_arquivo_gerado("outro") is not None
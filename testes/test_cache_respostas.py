@@ -0,0 +1,45 @@
+"""
+Classificação das perguntas para o cache de respostas: só as claramente genéricas
+são respondidas sem o contexto do usuário e compartilhadas entre usuários.
+"""
+import pytest
+
+from paginas.cache_respostas import pode_usar_cache
+
+
+def _pergunta(texto):
+    return [{"role": "assistant", "content": "Olá!"}, {"role": "user", "content": texto}]
+
+
+@pytest.mark.parametrize("pergunta", [
+    "Ela não quer comer desde ontem, o que faço?",
+    "Ele está mancando da pata traseira",
+    "Tenho um gato de 14 anos com insuficiência renal, o que posso dar?",
+    "Meu cachorro comeu chocolate",
+    "Tô preocupada, o gato vomitou hoje",
+    "Levei no veterinário e ele receitou dipirona, está certo?",
+    "Notei uma bolinha na barriga do cachorro",
+    "Eu dou ração duas vezes por dia, está bom?",
+    "Como dar remédio para o Thor?",
+])
+def test_perguntas_pessoais_nao_usam_cache(pergunta):
+    assert not pode_usar_cache(pergunta, _pergunta(pergunta), termos_privados=["Thor", "Ana"])
+
+
+@pytest.mark.parametrize("pergunta", [
+    "Cachorro pode comer uva?",
+    "Quantas vezes por dia um filhote de gato deve comer?",
+    "Quais são os sintomas de insuficiência renal em gatos?",
+    "Com que idade castrar uma cadela?",
+    "Posso dar chocolate para cachorro?",
+])
+def test_perguntas_genericas_usam_cache(pergunta):
+    assert pode_usar_cache(pergunta, _pergunta(pergunta), termos_privados=["Thor", "Ana"])
+
+
+def test_pergunta_no_meio_da_conversa_nao_usa_cache():
+    mensagens = _pergunta("Cachorro pode comer uva?") + [
+        {"role": "assistant", "content": "Não!"},
+        {"role": "user", "content": "E banana?"},
+    ]
+    assert not pode_usar_cache("E banana?", mensagens)
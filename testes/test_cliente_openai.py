@@ -0,0 +1,103 @@
+"""
+Reaproveitamento de conexões do cliente OpenAI do processo (_criar_cliente_openai),
+contra um servidor local que imita /chat/completions e conta as conexões TCP abertas.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from paginas import llms
+
+RESPOSTA = {
+    "id": "chatcmpl-teste", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Au au!"}, "finish_reason": "stop"}],
+}
+
+
+@pytest.fixture
+def servidor_openai(monkeypatch):
+    """Servidor HTTP/1.1 com keep-alive; as primeiras 'falhas' requisições respondem 503."""
+    contagem = {"conexoes": 0, "requisicoes": 0, "falhas": 0}
+    trava = threading.Lock()
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with trava:
+                contagem["conexoes"] += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with trava:
+                contagem["requisicoes"] += 1
+                falhar = contagem["falhas"] > 0
+                if falhar:
+                    contagem["falhas"] -= 1
+            corpo = json.dumps({"error": {"message": "indisponível"}} if falhar else RESPOSTA).encode()
+            self.send_response(503 if falhar else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{servidor.server_address[1]}/v1")
+    try:
+        yield contagem
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def _perguntar(cliente):
+    resposta = cliente.chat.completions.create(
+        model=llms.MODELO_PADRAO, messages=[{"role": "user", "content": "Oi"}]
+    )
+    return resposta.choices[0].message.content
+
+
+def test_chamadas_seguidas_usam_uma_conexao(servidor_openai):
+    cliente = llms._criar_cliente_openai("chave-teste-seguidas")
+    for _ in range(20):
+        assert _perguntar(cliente) == "Au au!"
+    # O cliente é criado uma vez por chave
+    assert llms._criar_cliente_openai("chave-teste-seguidas") is cliente
+
+    print(f"\n20 chamadas seguidas: {servidor_openai['conexoes']} conexão(ões)")
+    assert servidor_openai["requisicoes"] == 20
+    assert servidor_openai["conexoes"] == 1
+
+
+def test_chamadas_paralelas_limitadas_pelo_pool(servidor_openai):
+    cliente = llms._criar_cliente_openai("chave-teste-paralelas")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        respostas = list(executor.map(lambda _: _perguntar(cliente), range(80)))
+
+    print(f"\n80 chamadas em 8 threads: {servidor_openai['conexoes']} conexão(ões)")
+    assert respostas == ["Au au!"] * 80
+    assert servidor_openai["conexoes"] <= 8
+
+
+def test_cliente_novo_por_chamada_abre_uma_conexao_cada(servidor_openai):
+    # Referência: o padrão antigo (um cliente por chamada) não reaproveita nada
+    for _ in range(5):
+        _perguntar(OpenAI(api_key="chave-teste", max_retries=0))
+    assert servidor_openai["conexoes"] == 5
+
+
+def test_erro_transitorio_repetido_pelo_sdk(servidor_openai):
+    servidor_openai["falhas"] = 2
+    cliente = llms._criar_cliente_openai("chave-teste-tentativas")
+
+    assert _perguntar(cliente) == "Au au!"
+    assert servidor_openai["requisicoes"] == 3
@@ -0,0 +1,94 @@
+"""
+Benchmark de obter_arquivos_locais contra um servidor HTTP local que serve N PDFs
+com uma latência artificial: os downloads precisam sair em paralelo, voltar na ordem
+da lista de entrada e, na segunda chamada, vir do cache em disco.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from paginas import funcoes
+
+NUM_PDFS = 12
+LATENCIA = 0.2  # segundos por requisição
+
+
+def _conteudo_pdf(indice):
+    return b"%PDF-1.4\n% exame " + str(indice).encode() + b"\n%%EOF\n"
+
+
+@pytest.fixture
+def servidor_pdfs():
+    """Sobe um servidor HTTP local; retorna a URL base e a lista de caminhos requisitados."""
+    requisicoes = []
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requisicoes.append(self.path)
+            time.sleep(LATENCIA)
+            nome = self.path.rsplit("/", 1)[-1].split(".")[0]
+            if not nome.isdigit():
+                self.send_error(404)
+                return
+            corpo = _conteudo_pdf(int(nome))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_address[1]}", requisicoes
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_downloads_paralelos_na_ordem(servidor_pdfs, cache_arquivos_temporario):
+    base, requisicoes = servidor_pdfs
+    # Ordem embaralhada e uma entrada vazia no meio
+    indices = [7, 2, 11, 0, 5, 9, 1, 10, 3, 8, 6, 4]
+    urls = [f"{base}/exames/{i}.pdf" for i in indices]
+    urls.insert(3, "")
+
+    inicio = time.perf_counter()
+    caminhos = funcoes.obter_arquivos_locais(urls)
+    tempo_frio = time.perf_counter() - inicio
+
+    assert caminhos[3] is None
+    conteudos = [open(caminho, "rb").read() for caminho in caminhos if caminho]
+    assert conteudos == [_conteudo_pdf(i) for i in indices]
+    assert len(requisicoes) == NUM_PDFS
+
+    sequencial = NUM_PDFS * LATENCIA
+    lotes = -(-NUM_PDFS // funcoes.MAX_DOWNLOADS_PARALELOS)
+    print(f"\n{NUM_PDFS} PDFs: {tempo_frio:.2f}s (sequencial seria {sequencial:.2f}s)")
+    assert tempo_frio < lotes * LATENCIA + 1.0
+    assert tempo_frio < sequencial / 2
+
+    # Segunda chamada: tudo vem do cache em disco, sem nenhuma requisição nova
+    inicio = time.perf_counter()
+    assert funcoes.obter_arquivos_locais(urls) == caminhos
+    tempo_quente = time.perf_counter() - inicio
+    print(f"Com cache: {tempo_quente * 1000:.1f} ms")
+    assert len(requisicoes) == NUM_PDFS
+    assert tempo_quente < LATENCIA
+
+
+def test_falha_nao_impede_os_demais(servidor_pdfs, cache_arquivos_temporario):
+    base, _ = servidor_pdfs
+    urls = [f"{base}/exames/1.pdf", f"{base}/exames/invalido.pdf", f"{base}/exames/2.pdf"]
+
+    caminhos = funcoes.obter_arquivos_locais(urls)
+
+    assert caminhos[1] is None
+    assert open(caminhos[0], "rb").read() == _conteudo_pdf(1)
+    assert open(caminhos[2], "rb").read() == _conteudo_pdf(2)
@@ -0,0 +1,44 @@
+"""
+Renderizador da resposta em streaming: agrupa os pedaços, mas nunca deixa texto
+guardado sem aparecer quando o modelo faz uma pausa.
+"""
+from paginas.exibicao import CURSOR, criar_renderizador
+
+
+class _ContainerFalso:
+    def __init__(self):
+        self.desenhos = []
+
+    def markdown(self, texto):
+        self.desenhos.append(texto)
+
+
+def test_agrupa_pedacos_e_descarrega_na_pausa():
+    container = _ContainerFalso()
+    renderizar = criar_renderizador(container, intervalo=60, max_pedacos=10)
+
+    texto = ""
+    for pedaco in ["Oi", ", ", "tudo", " bem", "?"]:
+        texto += pedaco
+        renderizar(texto)
+
+    # Só o primeiro pedaço aparece na hora; os demais ficam guardados até o intervalo
+    assert container.desenhos == ["Oi" + CURSOR]
+
+    renderizar.descarregar()
+    assert container.desenhos[-1] == "Oi, tudo bem?" + CURSOR
+
+    # Sem nada novo guardado, descarregar não redesenha
+    renderizar.descarregar()
+    assert renderizar.renderizacoes == 2
+
+    renderizar(texto, final=True)
+    assert container.desenhos[-1] == "Oi, tudo bem?"
+
+
+def test_numero_de_pedacos_forca_atualizacao():
+    container = _ContainerFalso()
+    renderizar = criar_renderizador(container, intervalo=60, max_pedacos=3)
+    for i in range(1, 8):
+        renderizar("x" * i)
+    assert container.desenhos == ["x" + CURSOR, "xxxx" + CURSOR, "xxxxxxx" + CURSOR]
@@ -0,0 +1,90 @@
+"""
+Registro de gerações do processo: uma sessão nova (página recarregada) encontra a
+resposta em andamento de uma conversa pelo par (email, chat_id) e volta a acompanhá-la.
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from paginas import geracao
+
+
+class _ClienteFalso:
+    """Imita o stream da OpenAI; cada pedaço só sai depois de liberado pelo teste."""
+
+    def __init__(self, pedacos):
+        self.pedacos = pedacos
+        self.liberar = threading.Semaphore(0)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    def _criar(self, **requisicao):
+        for pedaco in self.pedacos:
+            self.liberar.acquire()
+            delta = SimpleNamespace(content=pedaco)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+
+@pytest.fixture
+def cliente_falso(monkeypatch):
+    cliente = _ClienteFalso(["Oi, ", "tudo ", "bem?"])
+    gravadas = []
+    monkeypatch.setattr(geracao, "obter_cliente_openai", lambda: cliente)
+    monkeypatch.setattr(geracao, "salvar_resposta_parcial", lambda *args: True)
+    monkeypatch.setattr(geracao, "salvar_resposta_chat", lambda *args: gravadas.append(args) or True)
+    monkeypatch.setattr(geracao, "agendar_tarefas_pos_resposta", lambda *args, **kwargs: {})
+    cliente.gravadas = gravadas
+    return cliente
+
+
+def _esperar_texto(geracao_id, texto):
+    versao = -1
+    for _ in range(100):
+        estado = geracao.acompanhar_geracao(geracao_id, versao, timeout=0.05)
+        if estado["texto"] == texto:
+            return estado
+        versao = estado["versao"]
+    raise AssertionError(f"texto {texto!r} não apareceu")
+
+
+def test_sessao_nova_retoma_a_geracao_da_conversa(cliente_falso):
+    dados_sessao = {"chat_id": "chat1", "chat_criado": False, "resumo_chat": None, "info_contexto": {}}
+    geracao_id = geracao.iniciar_geracao(
+        "tutor@exemplo.com", "chat1", 4, {}, [], dados_sessao=dados_sessao
+    )
+    cliente_falso.liberar.release()
+    _esperar_texto(geracao_id, "Oi, ")
+
+    # A sessão original troca de conversa (ou some); a geração continua
+    geracao.abandonar_geracao(geracao_id)
+    assert geracao.retomar_geracao_do_chat("tutor@exemplo.com", "outro_chat") is None
+    assert geracao.retomar_geracao_do_chat("outra@exemplo.com", "chat1") is None
+
+    retomada = geracao.retomar_geracao_do_chat("tutor@exemplo.com", "chat1")
+    assert retomada == {"id": geracao_id, "ordem": 4, "dados_sessao": dados_sessao}
+
+    # Retomada, ela não é descartada ao terminar: a sessão nova busca o resultado
+    cliente_falso.liberar.release()
+    cliente_falso.liberar.release()
+    estado = _esperar_texto(geracao_id, "Oi, tudo bem?")
+    while not estado["concluida"]:
+        estado = geracao.acompanhar_geracao(geracao_id, estado["versao"], timeout=0.05)
+
+    final = geracao.finalizar_geracao(geracao_id)
+    assert final["texto"] == "Oi, tudo bem?" and final["persistida"]
+    assert cliente_falso.gravadas == [("tutor@exemplo.com", "chat1", 4, "Oi, tudo bem?")]
+    assert geracao.retomar_geracao_do_chat("tutor@exemplo.com", "chat1") is None
+
+
+def test_geracao_abandonada_e_concluida_nao_e_retomada(cliente_falso):
+    geracao_id = geracao.iniciar_geracao("tutor@exemplo.com", "chat2", 2, {}, [])
+    geracao.abandonar_geracao(geracao_id)
+    for _ in cliente_falso.pedacos:
+        cliente_falso.liberar.release()
+
+    # Concluída sem ninguém acompanhando: sai do processo (a resposta já está no Firestore)
+    for _ in range(100):
+        if geracao.acompanhar_geracao(geracao_id, -1) is None:
+            break
+        threading.Event().wait(0.02)
+    assert geracao.retomar_geracao_do_chat("tutor@exemplo.com", "chat2") is None
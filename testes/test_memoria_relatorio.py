@@ -0,0 +1,100 @@
+"""
+Pico de memória (RSS) ao gravar arquivos gerados e ao montar o relatório do pet.
+
+Cada cenário roda num processo separado, porque ru_maxrss é o pico do processo inteiro.
+O arquivo gravado em partes vai direto para o disco, sem cópia em memória. Na montagem,
+os exames são mapeados um de cada vez e o PDF final não é duplicado num buffer. Assim,
+o pico cresce no máximo o tamanho do relatório (as páginas que o PdfWriter guarda).
+"""
+import io
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MB = 1024 * 1024
+
+
+def _pico_mb():
+    # No Linux, ru_maxrss vem em KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _pdf_exame():
+    """PDF de ~0,6 MB com uma imagem de ruído (não comprime)."""
+    from PIL import Image
+    imagem = Image.frombytes("RGB", (1200, 900), os.urandom(1200 * 900 * 3))
+    buffer = io.BytesIO()
+    imagem.save(buffer, "PDF", resolution=100)
+    return buffer.getvalue()
+
+
+def _cenario_gravar(tamanho_mb):
+    from paginas.cache_arquivos import gravar_arquivo_gerado
+    parte = os.urandom(MB)
+
+    def escrever(arquivo):
+        for _ in range(tamanho_mb):
+            arquivo.write(parte)
+
+    antes = _pico_mb()
+    caminho = gravar_arquivo_gerado(f"teste-memoria:{time.time()}", escrever)
+    return _pico_mb() - antes, os.path.getsize(caminho) / MB
+
+
+def _cenario_relatorio(num_exames):
+    from paginas import cache_arquivos, funcoes
+    pdf = _pdf_exame()
+    exames = []
+    for i in range(num_exames):
+        url = f"https://exemplo.invalid/exames/{i}.pdf"
+        cache_arquivos.obter_arquivo(url, lambda _: pdf)
+        exames.append({
+            "id": f"exame{i}", "nome_exame": f"Exame {i}", "url_pdf": url,
+            "data_upload": datetime(2024, 1, 1 + i % 28), "status_processamento": "concluido",
+        })
+    del pdf
+    pet = {"id": "pet-memoria", "nome": "Rex", "url_foto": "", "data_cadastro": datetime(2024, 1, 1)}
+
+    antes = _pico_mb()
+    caminho = funcoes.gerar_relatorio_pet_pdf(pet, exames)
+    return _pico_mb() - antes, os.path.getsize(caminho) / MB
+
+
+def _rodar_cenario(tmp_path, *argumentos):
+    ambiente = dict(os.environ, DR_TOBIAS_CACHE_DIR=str(tmp_path / "cache"), DR_TOBIAS_CACHE_MAX_MB="1024")
+    resultado = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *map(str, argumentos)],
+        cwd=RAIZ_PROJETO, env=ambiente, capture_output=True, text=True, timeout=300
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    crescimento, tamanho = map(float, resultado.stdout.split()[-2:])
+    return crescimento, tamanho
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss em KB só no Linux")
+def test_gravar_arquivo_gerado_nao_acumula_em_memoria(tmp_path):
+    crescimento, tamanho = _rodar_cenario(tmp_path, "gravar", 128)
+    print(f"\nArquivo de {tamanho:.0f} MB: pico de RSS +{crescimento:.1f} MB")
+    assert tamanho == 128
+    assert crescimento < 16
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss em KB só no Linux")
+def test_montagem_do_relatorio_limitada_ao_tamanho_do_pdf(tmp_path):
+    crescimento, tamanho = _rodar_cenario(tmp_path, "relatorio", 60)
+    print(f"\nRelatório de {tamanho:.1f} MB: pico de RSS +{crescimento:.1f} MB")
+    assert tamanho > 30
+    assert crescimento < 1.5 * tamanho
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, RAIZ_PROJETO)
+    cenario, parametro = sys.argv[1], int(sys.argv[2])
+    cenarios = {"gravar": _cenario_gravar, "relatorio": _cenario_relatorio}
+    print(*cenarios[cenario](parametro))
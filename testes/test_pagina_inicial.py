@@ -0,0 +1,80 @@
+"""
+Benchmark da página inicial: nenhum relatório é montado ao renderizar, então cada pet
+ou exame a mais custa só os seus widgets, e não downloads e junção de PDFs.
+
+Roda sem Firebase: as leituras do Firestore são substituídas por dados em memória.
+"""
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from paginas import agentes_funcoes, funcoes
+
+PAGINA_INICIAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "paginas", "inicial.py")
+
+
+def _pets_e_exames(num_pets, exames_por_pet):
+    pets = [
+        {
+            "id": f"pet{i}", "nome": f"Pet {i}", "especie": "Cão", "idade": 3, "raca": "SRD",
+            "sexo": "Macho", "castrado": "Sim", "url_foto": "", "peso": "", "altura": "",
+            "historia": "", "saude": "", "alimentacao": "",
+            "data_cadastro": None, "data_atualizacao": None,
+        }
+        for i in range(num_pets)
+    ]
+    exames = {
+        pet["id"]: [
+            {
+                "id": f"{pet['id']}-exame{j}", "nome_exame": f"Hemograma {j}",
+                "url_pdf": f"https://exemplo.invalid/{pet['id']}/{j}.pdf",
+                "status_processamento": "concluido", "data_upload": None, "data_atualizacao": None,
+            }
+            for j in range(exames_por_pet)
+        ]
+        for pet in pets
+    }
+    return pets, exames
+
+
+def _medir_renderizacao(monkeypatch, num_pets, exames_por_pet, repeticoes=3):
+    pets, exames = _pets_e_exames(num_pets, exames_por_pet)
+    relatorios_gerados = []
+
+    monkeypatch.setattr(funcoes, "obter_pets", lambda: pets)
+    monkeypatch.setattr(funcoes, "obter_exames_pets", lambda ids: exames)
+    monkeypatch.setattr(funcoes, "registrar_acao_usuario", lambda *args, **kwargs: None)
+    monkeypatch.setattr(funcoes, "gerar_relatorio_pet_pdf", lambda *args: relatorios_gerados.append(args))
+    monkeypatch.setattr(agentes_funcoes, "retomar_exames_pendentes", lambda exames_por_pet: 0)
+
+    app = AppTest.from_file(PAGINA_INICIAL, default_timeout=30)
+    app.run()  # Primeira execução (importações e aquecimento) fica fora da medição
+    assert not app.exception
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        app.run()
+        tempos.append(time.perf_counter() - inicio)
+        assert not app.exception
+
+    # Nenhum relatório é montado só por abrir a página
+    assert relatorios_gerados == []
+    return min(tempos)
+
+
+
+def test_renderizacao_nao_monta_relatorios(monkeypatch):
+    pequeno = _medir_renderizacao(monkeypatch, num_pets=1, exames_por_pet=1)
+    grande = _medir_renderizacao(monkeypatch, num_pets=6, exames_por_pet=30)
+    exames_extras = 6 * 30 - 1
+    custo_por_exame = (grande - pequeno) / exames_extras
+    print(
+        f"\nPágina inicial: 1 pet/1 exame {pequeno * 1000:.0f} ms; 6 pets/180 exames {grande * 1000:.0f} ms "
+        f"({custo_por_exame * 1000:.2f} ms por exame)"
+    )
+
+    # Cada exame a mais custa só as linhas de texto do card (menos de um milissegundo),
+    # não o download e a junção do PDF, que antes aconteciam a cada renderização
+    assert custo_por_exame < 0.005